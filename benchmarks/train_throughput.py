@@ -0,0 +1,171 @@
+""" Training throughput of every algorithm on maps of increasing size
+
+    Run from the repository root:
+        python -m benchmarks.train_throughput -o bench.json
+        python -m benchmarks.train_throughput --compare old.json new.json
+
+    Every case runs headless in a fresh process with fixed seeds and reports
+    steps/sec, episodes/sec, peak RSS and the time to convergence (training
+    stops once the Q sum changes by less than the precision between episodes).
+"""
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import pathlib
+import resource
+import contextlib
+import subprocess
+import multiprocessing
+
+import numpy as np
+
+import config
+
+sizes_2d = [5, 10, 20, 50, 100, 200]
+sizes_1d = [10, 50, 100, 500]
+
+
+def build_env(env_name, size, seed):
+    from src.envs import envs
+
+    random.seed(seed)
+    np.random.seed(seed)
+    if env_name == "TreasureHunt2D":
+        return envs[env_name](mapfile=None, size=(size, size), save=False)
+    return envs[env_name](size=size)
+
+
+def run_case(case):
+    """ Train one (env, size, algorithm) case, in a process of its own """
+    from src.AI.agent import Agent
+
+    env = build_env(case["env"], case["size"], case["seed"])
+    with tempfile.TemporaryDirectory() as tmp:
+        agent = Agent(
+            env=env,
+            q_file=pathlib.Path(tmp) / "Q.bin",
+            max_train_episodes=case["max_episodes"],
+            epsilon_base=config.epsilon_base,
+            epsilon_decay_rate=config.epsilon_decay_rate,
+            gamma=config.gamma,
+            learning_rate=config.learning_rate,
+            lmd=config.lmd,
+            initial_q_mode="zero",
+            termination_type="loss",
+            termination_precision=case["precision"],
+            info_episodes=case["max_episodes"] + 1,
+        )
+        agent.result_path = pathlib.Path(tmp)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = agent.train(algorithm=case["algorithm"])
+        elapsed = time.perf_counter() - start
+    episodes = result["episode_number"]
+    steps = int(result["episode_steps"][:episodes].sum())
+    converged = episodes < case["max_episodes"]
+    return {
+        **case,
+        "status": "ok",
+        "seconds": elapsed,
+        "episodes": episodes,
+        "steps": steps,
+        "steps_per_sec": steps / elapsed,
+        "episodes_per_sec": episodes / elapsed,
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (2 ** 20 if sys.platform == "darwin" else 2 ** 10),
+        "converged": converged,
+        "time_to_convergence": elapsed if converged else None,
+    }
+
+
+def run_isolated(case, timeout):
+    """ Run a case in a fresh process, so that peak RSS belongs to this case only """
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        pending = pool.apply_async(run_case, (case,))
+        try:
+            return pending.get(timeout)
+        except multiprocessing.TimeoutError:
+            pool.terminate()
+            return {**case, "status": "timeout", "seconds": timeout}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark(algorithms, sizes_2d, sizes_1d, max_episodes, precision, seed, timeout):
+    cases = [
+        {"env": env_name, "size": size, "algorithm": alg, "seed": seed,
+         "max_episodes": max_episodes, "precision": precision}
+        for env_name, sizes in (("TreasureHunt2D", sizes_2d), ("TreasureHunt", sizes_1d))
+        for size in sizes for alg in algorithms
+    ]
+    records = []
+    for ind, case in enumerate(cases, start=1):
+        record = run_isolated(case, timeout)
+        records.append(record)
+        if record["status"] == "ok":
+            print(f"[{ind}/{len(cases)}] {case['env']} size={case['size']} {case['algorithm']}: "
+                  f"{record['steps_per_sec']:.0f} steps/s, {record['episodes_per_sec']:.1f} episodes/s, "
+                  f"peak RSS {record['peak_rss_mb']:.1f} MB, converged: {record['converged']}")
+        else:
+            print(f"[{ind}/{len(cases)}] {case['env']} size={case['size']} {case['algorithm']}: "
+                  f"timed out after {timeout}s")
+    return {
+        "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "records": records,
+    }
+
+
+def compare(old_file, new_file):
+    """ Print the steps/sec ratio new/old of every case found in both files """
+    def key(record):
+        return record["env"], record["size"], record["algorithm"]
+    old = {key(r): r for r in json.loads(pathlib.Path(old_file).read_text())["records"]}
+    new = {key(r): r for r in json.loads(pathlib.Path(new_file).read_text())["records"]}
+    for k in sorted(old.keys() & new.keys(), key=str):
+        if old[k]["status"] == new[k]["status"] == "ok":
+            ratio = new[k]["steps_per_sec"] / old[k]["steps_per_sec"]
+            print(f"{k[0]} size={k[1]} {k[2]}: {ratio:.2f}x steps/s")
+        else:
+            print(f"{k[0]} size={k[1]} {k[2]}: {old[k]['status']} -> {new[k]['status']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark training throughput')
+    parser.add_argument('-a', '--algorithms', nargs='+', default=config.algorithms)
+    parser.add_argument('--sizes-2d', nargs='*', type=int, default=sizes_2d)
+    parser.add_argument('--sizes-1d', nargs='*', type=int, default=sizes_1d)
+    parser.add_argument('-e', '--max-episodes', type=int, default=200)
+    parser.add_argument('-p', '--precision', type=float, default=1e-4, help='Convergence precision of the Q sum')
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    parser.add_argument('-t', '--timeout', type=float, default=600, help='Seconds allowed per case')
+    parser.add_argument('-o', '--output', default='bench_train.json', help='JSON file of the results')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='Compare two result files and exit')
+    args = parser.parse_args(argv)
+    if args.compare:
+        compare(*args.compare)
+        return
+    results = benchmark(
+        args.algorithms, args.sizes_2d, args.sizes_1d,
+        args.max_episodes, args.precision, args.seed, args.timeout,
+    )
+    pathlib.Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
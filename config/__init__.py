@@ -15,6 +15,15 @@ train_termination_config = {
     # When to terminate training, by number of episodes or by loss
     "termination_type": "loss", #"episode_num",  # "loss"
     "termination_precision": 1e-4,  # Only used for convergence by loss,
+    # "max_delta": the largest change of one Q value over the last termination_window
+    # episodes, "td_error": their root mean square TD error, are the other criteria
+    "termination_window": 10,
+}
+
+checkpoint_config = {
+    # The Q table is also saved whenever training stops
+    "checkpoint_episodes": None,  # Save the Q table every N episodes
+    "checkpoint_seconds": 60,  # Save the Q table every T seconds
 }
 
 max_train_episodes = 1000
@@ -5,19 +5,23 @@ import os
 
 import numpy as np
 import random
-import pandas as pd
 import time
 import pathlib
 import functools
 
 from src.analysis import Result
+from src.AI.qtable import QTable
+from src.AI.trace import EligibilityTrace
+from src.AI.checkpoint import Checkpoint, MetricsLog, atomic_write
+from src.AI.profiling import PhaseProfiler
+from src.AI import kernels, evaluation
+from src.AI.selection import ActionSelector
+from src.AI.convergence import ConvergenceTracker
 
 file_path = pathlib.Path(__file__).parent
 defaultQfile = file_path / 'Q.csv'
 defaultConvfile = file_path / 'q_sum.csv'
 
-df = pd.DataFrame
-
 class OutOfRangeException(Exception):
     pass
 
@@ -39,14 +43,21 @@ class Agent:
         phi=1e-4,
         eta=0.9,
         lmd=0.9, # lambda-return
+        trace_cutoff=1e-6,
         train_render=False,
         train_render_interval=0,
         train_render_clear=False,
         termination_type="episode",
         termination_precision=None,
+        termination_window=10,
+        checkpoint_episodes=None,
+        checkpoint_seconds=None,
         heuristic=False,
         initial_q_mode="zero",
         info_episodes=100,
+        profile=False,
+        profile_file=None,
+        compiled=True,
         result=None,
     ):
         # Define state and action
@@ -62,7 +73,12 @@ class Agent:
         self.train_render_clear = train_render_clear
         self.termination_type = termination_type
         self.termination_precision = termination_precision
+        # Episodes over which the "max_delta" and "td_error" criteria are taken
+        self.termination_window = termination_window
+        self.convergence = None
         self.max_train_episodes = max_train_episodes
+        # Besides these, the Q table is saved whenever training stops
+        self.checkpoint = Checkpoint(episodes=checkpoint_episodes, seconds=checkpoint_seconds)
         self.info_episodes = info_episodes
         self.eta = eta
         self.lmd = lmd
@@ -79,9 +95,11 @@ class Agent:
             if not self.q_file.is_file():
                 raise QFileNotFoundError('Please check if the Q file exists at: {}'.format(q_file))
             self.q_table = self.load_q(file_name=self.q_file)
+            # The Q file itself is the backup, a memory-mapped table is not copied
+            self.q_table_backup = None
         else:
             self.q_table = self.build_q_table(initial_q_mode)
-        self.q_table_backup = self.q_table.copy()
+            self.q_table_backup = self.q_table.copy()
 
         self.epsilon_base = epsilon_base
         self.epsilon_decay_rate = epsilon_decay_rate
@@ -93,13 +111,25 @@ class Agent:
         self.A = self.learning_rate * self.B
         self.heuristic = heuristic
         # Eligibility Trace
-        self.eligibility_trace = self.build_q_table(mode="zero")
-        def _clear(self, target, mode="zero"):
-            df = getattr(self, target)
-            for col in df.columns:
-                df[col].values[:] = 0
+        self.eligibility_trace = EligibilityTrace(self.dimension, cutoff=trace_cutoff)
         # Set eligitbility trace to zero
-        self._clear_et = functools.partial(_clear, self, "eligibility_trace")
+        self._clear_et = self.eligibility_trace.clear
+
+        # Per-phase timing of training, None when disabled. The profile is exported to
+        # profile_file after training, as a Chrome trace for .json and collapsed stacks otherwise
+        self.profile_file = profile_file
+        if profile or profile_file:
+            record_events = profile_file is not None and pathlib.Path(profile_file).suffix == '.json'
+            self.profiler = PhaseProfiler(record_events=record_events)
+        else:
+            self.profiler = None
+
+        # Run whole episodes in the TD kernels when the env has transition tables
+        # and nothing needs to see the individual steps
+        self.compiled = compiled
+        # Cached per-state greedy actions, rebuilt when the Q table is replaced
+        self.selector = None
+        self._action_mask = None
 
         # This is an instance of Result that is used to store all results during training
         self.result = result
@@ -119,7 +149,10 @@ class Agent:
 
     def reset(self):
         self._clear_et()
-        self.q_table = self.q_table_backup.copy()
+        if self.q_table_backup is None:
+            self.load_q()
+        else:
+            self.q_table = self.q_table_backup.copy()
 
     def load_config(self, config):
         seq = ['epsilon_base', 'gamma', 'alpha', 'phi']
@@ -128,16 +161,15 @@ class Agent:
     def load_q(self, file_name=None):
         if file_name is None:
             file_name = self.q_file
-        self.q_table = pd.read_csv(file_name, header=None, index_col=False)
-        self.q_table.columns = self.env.action_space
-        self.q_table.index = pd.MultiIndex.from_tuples(self.env.observation_space)
+        self.q_table = QTable.read(file_name, self.env.observation_space, self.env.action_space)
         return self.q_table
 
     def save_q(self):
-        self.q_table.to_csv(self.q_file, index=False, header=False)
+        atomic_write(self.q_file, lambda name: self.q_table.dump(name, env_name=self.env.name))
+        self.checkpoint.done()
 
     def save_conv(self, filename, conv):
-        np.savetxt(filename, conv)
+        atomic_write(filename, lambda name: np.savetxt(name, conv))
 
     def save_reward(self):
         return np.array(self.reward_per_episode).mean()
@@ -164,12 +196,10 @@ class Agent:
 
     def build_q_table(self, mode="zero"):
         func = self._q_init_func[mode]
-        index = pd.MultiIndex.from_tuples(self.env.observation_space)
-        columns = self.env.action_space
-        Q_table = df(
+        Q_table = QTable(
+            self.env.observation_space,
+            self.env.action_space,
             func(self.dimension), # Q value initialization
-            index=index,
-            columns=columns,
         )
         return Q_table
 
@@ -189,27 +219,36 @@ class Agent:
     def epsilon_decay(self, episode):
         self.epsilon = self.epsilon_base * self.epsilon_decay_rate/episode
 
+    def action_mask(self):
+        """ Boolean array (states × actions) of the actions `action_filter` allows """
+        if self._action_mask is None:
+            mask = getattr(self.env, "valid_action_mask", None)
+            if mask is None:
+                mask = np.zeros(self.dimension, dtype=bool)
+                for row, state in enumerate(self.q_table.states):
+                    mask[row, self.q_table.cols(self.action_filter(state))] = True
+            self._action_mask = mask
+        return self._action_mask
+
+    def action_selector(self):
+        """ Cache of the greedy actions of the current Q table
+            Set `self.selector = None` after changing the Q values in place
+            outside of training, so that the cache is rebuilt.
+        """
+        if self.selector is None or self.selector.q_values is not self.q_table.values:
+            self.selector = ActionSelector(self.q_table.values, self.action_mask())
+        return self.selector
+
     def epsilon_greedy_policy(self, state):
-        actions = self.action_filter(state)
-        if (len(actions) == 1):
-            return actions[0]
-        else:
-            if (np.random.uniform() < self.epsilon):
-                action = random.choice(actions)
-            else:
-                action = self.argmax(self.q_table, state, actions)
-            return action
+        action = self.action_selector().epsilon_greedy(self.q_table.row(state), self.epsilon)
+        return self.q_table.actions[action]
 
     def greedy_policy(self, state):
-        return self.argmax(self.q_table, state=state, available=self.action_filter(state))
+        return self.q_table.actions[self.action_selector().greedy(self.q_table.row(state))]
 
     @staticmethod
     def argmax(Q_table, state, available=None):
-        if available:
-            all_Q = Q_table.loc[state, available]
-        else:
-            all_Q = Q_table.loc[state, :]
-        return all_Q.squeeze().idxmax()
+        return Q_table.argmax(state, available)
 
     def choose_heuristic_action(self, state):
         available_actions = self.available_actions(state)
@@ -223,79 +262,227 @@ class Agent:
                 action = all_Q.idxmax()
             return action
 
+    def train_episode(self, algorithm="Q_learning"):
+        q_table = self.q_table
+        q_values = q_table.values
+        actions = q_table.actions
+        selector = self.action_selector()
+        tracker = self.convergence
+        lap = self.profiler.lap if self.profiler else None
+        s_ind = q_table.row(self.env.reset())
+        if lap: lap("env.step")
+        a_ind = selector.epsilon_greedy(s_ind, self.epsilon)
+        if lap: lap("policy")
+        if algorithm == "SARSA_lambda" or algorithm == "Q_lambda":
+            self._clear_et()
+            if lap: lap("trace")
+        # self.epsilon_decay(episode)
+        done = False
+        step = 1
+        # Total reward of one episode
+        episode_reward = 0
+        while not done:
+            self.render()
+            if lap: lap("render")
+            q = q_values[s_ind, a_ind]
+            next_state, reward, done, info = self.env.step(actions[a_ind])
+            ns_ind = q_table.row(next_state)
+            if lap: lap("env.step")
+            na_ind = selector.epsilon_greedy(ns_ind, self.epsilon)
+            if lap: lap("policy")
+            episode_reward += reward
+            if done:
+                td_target = reward
+                exploration = True  # Force to set ET to zero
+            else:
+                if algorithm == "SARSA" or algorithm == "SARSA_lambda":
+                    target_q = q_values[ns_ind, na_ind]
+                elif algorithm == "Q_learning" or algorithm == "Q_lambda":
+                    target_q = selector.max_value[ns_ind]
+                    if algorithm == "Q_lambda":
+                        exploration = not target_q == q_values[ns_ind, na_ind]
+                elif algorithm == "Average_SARSA":
+                    target_q = q_values[ns_ind].mean()
+                td_target = reward + self.gamma * target_q
+            td_error = td_target - q
+            if algorithm == "SARSA_lambda" or algorithm == "Q_lambda":
+                if lap: lap("update")
+                self.eligibility_trace.visit(s_ind, a_ind)
+                deltas = self.eligibility_trace.update(q_values, self.learning_rate* td_error)
+                tracker.update_many(td_error, deltas)
+                selector.refresh_entries(self.eligibility_trace.active)
+                if algorithm == "Q_lambda" and exploration:
+                    self._clear_et()
+                else:
+                    self.eligibility_trace.decay(self.gamma * self.lmd)
+                if lap: lap("trace")
+            else:
+                q_values[s_ind, a_ind] += self.learning_rate* td_error
+                tracker.update(td_error, self.learning_rate* td_error)
+                selector.update(s_ind, a_ind)
+                if lap: lap("update")
+            s_ind, a_ind = ns_ind, na_ind
+            step += 1
+        return episode_reward, step - 1
+
+    def use_kernel(self):
+        return self.compiled and kernels.supports(self.env) and not self.train_render and self.profiler is None
+
+    def train_kernel_episodes(self, algorithm, episode, metrics):
+        """ Train a chunk of episodes in the TD kernel, starting from `episode`
+            Chunks end on the info and checkpoint episodes, so the caller reports
+            and saves as after single episodes. Fills the per-episode `metrics`
+            arrays and returns the number of episodes done.
+        """
+        bounds = [self.info_episodes] + ([self.checkpoint.episodes] if self.checkpoint.episodes else [])
+        n = min([b - episode % b for b in bounds] + [self.max_train_episodes - episode])
+        epsilons = [self.epsilon] + [
+            self.epsilon_base * self.epsilon_decay_rate / ep for ep in range(episode + 1, episode + n)
+        ]
+        done, stats = kernels.train_episodes(
+            self.env, self.q_table.values, self.q_table.row(self.env.reset()), algorithm, epsilons,
+            alpha=self.learning_rate, gamma=self.gamma, tracker=self.convergence, lmd=self.lmd,
+            cutoff=self.eligibility_trace.cutoff,
+            criterion=self.termination_type, precision=self.termination_precision,
+        )
+        # The kernel changed the Q values behind the cache
+        self.selector = None
+        for name, values in stats.items():
+            metrics[name][episode:episode + done] = values
+        return done
+
     def train(self, algorithm="Q_learning"):
         episode = 0
         stop = False
-        q_sum = np.zeros((self.max_train_episodes,))
-        episode_total_reward = np.zeros((self.max_train_episodes,))
+        metrics = {
+            "q_sum": np.zeros((self.max_train_episodes,)),
+            "episode_total_reward": np.zeros((self.max_train_episodes,)),
+            "episode_steps": np.zeros((self.max_train_episodes,), dtype=int),
+            # Largest change of a single Q entry and root mean square TD error of every episode
+            "max_delta": np.zeros((self.max_train_episodes,)),
+            "td_error": np.zeros((self.max_train_episodes,)),
+        }
+        q_sum = metrics["q_sum"]
+        episode_total_reward = metrics["episode_total_reward"]
+        episode_steps = metrics["episode_steps"]
+        # The only full scan of the Q table, the tracker then follows the updates
+        self.convergence = ConvergenceTracker(self.q_table.sum(), window=self.termination_window)
         self.epsilon = self.epsilon_base
-        while episode < self.max_train_episodes:
-            state = self.env.reset()
-            action = self.epsilon_greedy_policy(state=state)
-            if algorithm == "SARSA_lambda" or algorithm == "Q_lambda":
-                self._clear_et()
-            # self.epsilon_decay(episode)
-            done = False
-            step = 1
-            # Total reward of one episode
-            episode_reward = 0
-            while not done:
-                self.render()
-                q = self.q_table.at[state, action]
-                next_state, reward, done, info = self.env.step(action)
-                next_action = self.epsilon_greedy_policy(state=next_state)
-                episode_reward += reward
-                if done:
-                    td_target = reward
-                    exploration = True  # Force to set ET to zero
-                else:
-                    if algorithm == "SARSA" or algorithm == "SARSA_lambda":
-                        target_q = self.q_table.at[next_state, next_action]
-                    elif algorithm == "Q_learning" or algorithm == "Q_lambda":
-                        target_q = self.q_table.loc[next_state, :].max()
-                        if algorithm == "Q_lambda":
-                            exploration = not target_q == self.q_table.at[next_state, next_action]
-                    elif algorithm == "Average_SARSA":
-                        target_q = self.q_table.loc[next_state, :].mean()
-                    td_target = reward + self.gamma * target_q
-                td_error = td_target - q
-                if algorithm == "SARSA_lambda" or algorithm == "Q_lambda":
-                    self.eligibility_trace.at[state, action] += 1
-                    for s in self.env.observation_space:
-                        for a in self.env.action_space:
-                            self.q_table.at[s, a] += self.learning_rate* td_error * self.eligibility_trace.at[s, a]
-                            if algorithm == "SARSA_lambda":
-                                self.eligibility_trace.at[s, a] *= self.gamma * self.lmd
-                            elif algorithm == "Q_lambda":
-                                if exploration:
-                                    self.eligibility_trace.at[s, a] = 0
-                                else:
-                                    self.eligibility_trace.at[s, a] *= self.gamma * self.lmd
+        q_sum_filename = f"{self.env.name}-{algorithm}-train-Q_sum.txt"
+        metrics_log = MetricsLog(self.result_path / q_sum_filename, ["episode", "q_sum", "episode_total_reward"])
+        self.checkpoint.start()
+        self.selector = None
+        profiler = self.profiler
+        if profiler:
+            profiler.start_episode()
+        use_kernel = self.use_kernel()
+        try:
+            while episode < self.max_train_episodes:
+                if use_kernel:
+                    n = self.train_kernel_episodes(algorithm, episode, metrics)
                 else:
-                    self.q_table.at[state, action] += self.learning_rate* td_error
-                state = next_state
-                action = next_action
-                step += 1
+                    episode_reward, episode_steps[episode] = self.train_episode(algorithm)
+                    metrics["max_delta"][episode], metrics["td_error"][episode] = self.convergence.end_episode()
+                    q_sum[episode] = self.convergence.q_sum
+                    episode_total_reward[episode] = episode_reward
+                    n = 1
+                for ep in range(episode, episode + n):
+                    episode_reward = episode_total_reward[ep]
+                    metrics_log.write(ep, q_sum[ep], episode_reward)
+                    self.display_episode_info(episode=ep, q_sum=q_sum, episode_reward=episode_reward)
+                episode += n
+                self.epsilon_decay(episode)
+                if self.termination_type in kernels.criterion_codes:
+                    if self.convergence.converged(self.termination_type, self.termination_precision):
+                        break
+                self.convergence.next_episode()
+                if self.checkpoint.due(episode):
+                    self.save_q()
+                    metrics_log.flush()
+                    # Saving reads the whole table anyway
+                    self.convergence.resync(self.q_table.sum())
+                if profiler:
+                    profiler.lap("io")
+                    profiler.end_episode()
+        finally:
+            # Always keep the final Q table, on convergence, at the end or on errors
             self.save_q()
-            q_sum[episode] = self.q_table.sum().sum()
-            episode_total_reward[episode] = episode_reward
-            self.display_episode_info(episode=episode, q_sum=q_sum, episode_reward=episode_reward)
-            episode += 1
-            self.epsilon_decay(episode)
-            if self.termination_type == "loss" and episode >= 2:
-                convergence = abs(q_sum[episode - 1] - q_sum[episode - 2])
-                if convergence < self.termination_precision:
-                    break
-            q_sum_filename = f"{self.env.name}-{algorithm}-train-Q_sum.txt"
-            self.save_conv(self.result_path / q_sum_filename, q_sum)
+            metrics_log.close()
         self.display_episode_info(episode=episode, q_sum=q_sum, episode_reward=episode_reward, force=True)
+        result = {"episode_number": episode, **metrics}
+        if profiler:
+            result["profile"] = profiler.episodes
+            if self.profile_file:
+                profiler.export(self.profile_file)
+        return result
+
+    def batch_epsilon_greedy_policy(self, states, masks):
+        q = np.where(masks, self.q_table.values[states], -np.inf)
+        greedy = q.argmax(axis=1)
+        # Uniform choice among the available actions of every state
+        explore = np.where(masks, np.random.random(masks.shape), -1).argmax(axis=1)
+        return np.where(np.random.random(len(states)) < self.epsilon, explore, greedy)
+
+    def train_batch(self, batch_env, algorithm="Q_learning"):
+        """ Train the shared Q table on all environments of `batch_env` in lockstep
+            Every tick applies the TD updates of all N transitions at once, and an
+            environment that finishes an episode is reset independently.
+            Only the one-step algorithms (Q_learning, SARSA, Average_SARSA) are supported.
+        """
+        if algorithm not in ("Q_learning", "SARSA", "Average_SARSA"):
+            raise ValueError(f"Algorithm {algorithm} is not supported by batched training")
+        if len(batch_env.observation_space) != self.dimension[0]:
+            raise ValueError("The batched environment does not match the size of the Q table")
+        q_values = self.q_table.values
+        episode = 0
+        q_sum = []
+        episode_total_reward = []
+        self.epsilon = self.epsilon_base
+        states = batch_env.reset()
+        actions = self.batch_epsilon_greedy_policy(states, batch_env.action_filter(states))
+        episode_reward = np.zeros((batch_env.batch_size,))
+        while episode < self.max_train_episodes:
+            next_states, rewards, dones, info = batch_env.step(actions)
+            episode_reward += rewards
+            if algorithm == "SARSA":
+                next_actions = self.batch_epsilon_greedy_policy(next_states, batch_env.action_filter(next_states))
+                target_q = q_values[next_states, next_actions]
+            elif algorithm == "Q_learning":
+                target_q = q_values[next_states].max(axis=1)
+            elif algorithm == "Average_SARSA":
+                target_q = q_values[next_states].mean(axis=1)
+            td_target = rewards + self.gamma * np.where(dones, 0, target_q)
+            td_error = td_target - q_values[states, actions]
+            # Several environments may hit the same entry within one tick, average
+            # their TD errors so that the step size does not grow with N
+            entries, inverse = np.unique(states * self.dimension[1] + actions, return_inverse=True)
+            mean_td_error = np.bincount(inverse, weights=td_error) / np.bincount(inverse)
+            q_values.flat[entries] += self.learning_rate * mean_td_error
+            if dones.any():
+                for reward in episode_reward[dones]:
+                    episode_total_reward.append(reward)
+                    q_sum.append(q_values.sum())
+                    self.display_episode_info(episode=episode, q_sum=q_sum, episode_reward=reward)
+                    episode += 1
+                self.epsilon_decay(episode)
+                episode_reward[dones] = 0
+                next_states = batch_env.reset(dones)
+                if algorithm == "SARSA":
+                    next_actions[dones] = self.batch_epsilon_greedy_policy(
+                        next_states[dones], batch_env.action_filter(next_states)[dones])
+            if algorithm != "SARSA":
+                next_actions = self.batch_epsilon_greedy_policy(next_states, batch_env.action_filter(next_states))
+            states, actions = next_states, next_actions
+        self.selector = None
+        self.display_episode_info(episode=episode, q_sum=q_sum, episode_reward=episode_total_reward[-1], force=True)
         return {
             "episode_number": episode,
-            "q_sum": q_sum,
-            "episode_total_reward": episode_total_reward,
+            "q_sum": np.array(q_sum),
+            "episode_total_reward": np.array(episode_total_reward),
         }
 
     def run(self):
+        self.selector = None
         state = self.env.reset()
         self.env.render()
         done = False
@@ -308,6 +495,10 @@ class Agent:
             state = next_state
         print(f"Total reward: {total_reward}")
 
+    def evaluate(self, **kwargs):
+        """ Headless greedy rollouts of the Q table from every start state, see `evaluation.evaluate` """
+        return evaluation.evaluate(self.env, self.q_table, gamma=self.gamma, **kwargs)
+
     def exlongterm(self):
         return self._q_table.max(axis=1).sum()/self._dimension[0]
 
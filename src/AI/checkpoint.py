@@ -0,0 +1,72 @@
+import os
+import time
+import pathlib
+import tempfile
+
+
+def atomic_write(file_name, write):
+    """ Call `write(path)` on a temporary file next to `file_name`, then rename it over `file_name`
+        Readers never see a partially written file.
+    """
+    file_name = pathlib.Path(file_name)
+    # Keep the suffix, writers may choose the format from it
+    fd, tmp_name = tempfile.mkstemp(dir=file_name.parent, prefix=f".{file_name.stem}.", suffix=f".tmp{file_name.suffix}")
+    os.close(fd)
+    try:
+        write(tmp_name)
+        os.replace(tmp_name, file_name)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+
+
+class Checkpoint:
+    def __init__(self, episodes=None, seconds=None):
+        """ When to save the Q table during training
+            Training always saves once more when it stops, either on convergence,
+            after the last episode or on an exception.
+
+            Parameters:
+                @episodes: Save every `episodes` episodes, None to disable
+                @seconds: Save when `seconds` have passed since the last save, None to disable
+        """
+        self.episodes = episodes
+        self.seconds = seconds
+        self.start()
+
+    def start(self):
+        self.last_time = time.monotonic()
+
+    def due(self, episode):
+        if self.episodes and not episode % self.episodes:
+            return True
+        if self.seconds is not None and time.monotonic() - self.last_time >= self.seconds:
+            return True
+        return False
+
+    def done(self):
+        self.last_time = time.monotonic()
+
+
+class MetricsLog:
+    def __init__(self, file_name, columns):
+        """ Append-only text log with one record per episode
+
+            Parameters:
+                @file_name: Path of the log, truncated when opened
+                @columns: Names of the values of every record, written as the header
+        """
+        self.file_name = pathlib.Path(file_name)
+        self.file_name.parent.mkdir(parents=True, exist_ok=True)
+        self.columns = columns
+        self._file = open(self.file_name, 'w')
+        self._file.write(f"# {' '.join(columns)}\n")
+
+    def write(self, *values):
+        self._file.write(' '.join(repr(float(v)) for v in values) + '\n')
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,65 @@
+import math
+
+import numpy as np
+
+from src.AI.kernels import convergence_value, criterion_codes, push_episode
+
+
+class ConvergenceTracker:
+    def __init__(self, q_sum, window=10):
+        """ Convergence statistics maintained from the TD updates
+            Keeps a running Q sum and, over the last `window` episodes, the largest
+            change of a single Q entry and the TD errors, so that no full scan of
+            the Q table is needed per episode.
+
+            Parameters:
+                @q_sum: Sum of the Q table when training starts
+                @window: Number of episodes of the max |ΔQ| and TD error criteria
+        """
+        self.q_sum = float(q_sum)
+        self.prev_sum = math.nan
+        self.window = window
+        self.history = np.zeros((3, window))
+        self.seen = np.zeros(1, dtype=np.int64)
+        self._start_episode()
+
+    def _start_episode(self):
+        self.max_delta = 0.0
+        self.td_square = 0.0
+        self.td_count = 0
+
+    def update(self, td_error, delta):
+        """ One Q entry changed by `delta` for the TD error `td_error` """
+        self.q_sum += delta
+        self.max_delta = max(self.max_delta, abs(delta))
+        self.td_square += td_error * td_error
+        self.td_count += 1
+
+    def update_many(self, td_error, deltas):
+        """ Several Q entries changed by `deltas` for one TD error, as with eligibility traces """
+        self.q_sum += float(deltas.sum())
+        if deltas.size:
+            self.max_delta = max(self.max_delta, float(np.abs(deltas).max()))
+        self.td_square += td_error * td_error
+        self.td_count += 1
+
+    def end_episode(self):
+        """ Close the episode and return its max |ΔQ| and root mean square TD error """
+        push_episode(self.history, self.seen, self.max_delta, self.td_square, self.td_count)
+        stats = self.max_delta, math.sqrt(self.td_square / self.td_count) if self.td_count else 0.0
+        self._start_episode()
+        return stats
+
+    def value(self, criterion):
+        return convergence_value(criterion_codes[criterion], self.history, self.seen, self.q_sum, self.prev_sum)
+
+    def converged(self, criterion, precision):
+        """ Whether the value of `criterion` dropped below `precision`, to call after `end_episode` """
+        return self.value(criterion) < precision
+
+    def next_episode(self):
+        self.prev_sum = self.q_sum
+
+    def resync(self, q_sum):
+        """ Replace the running sum by an exact one, dropping accumulated rounding errors """
+        self.q_sum = float(q_sum)
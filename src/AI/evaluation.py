@@ -0,0 +1,116 @@
+import argparse
+import collections
+
+import numpy as np
+
+from src.AI.planning import build_model
+from src.AI.qtable import QTable
+
+# Greedy rollouts from a set of start states
+#   starts[i]: Start state of rollout i
+#   success[i]: Whether it ended in a terminal state entered with a positive reward
+#   terminated[i]: Whether it ended in any terminal state
+#   steps[i]: Number of steps taken
+#   returns[i]: Discounted sum of the rewards
+#   success_rate: Mean of success
+Evaluation = collections.namedtuple(
+    "Evaluation", ["starts", "success", "terminated", "steps", "returns", "success_rate"],
+)
+
+
+def greedy_policy(q_values, mask):
+    """ Greedy action index of every state among its available actions, -1 if none is available
+        Ties go to the lowest action index, as `QTable.argmax` does.
+    """
+    policy = np.where(mask, q_values, -np.inf).argmax(axis=1)
+    policy[~mask.any(axis=1)] = -1
+    return policy
+
+
+def rollout(model, policy, starts, max_steps, gamma=1):
+    """ Follow `policy` from all `starts` at once for at most `max_steps` steps
+        A deterministic policy that has not ended after visiting as many states
+        as the model has is caught in a loop, so `max_steps` defaults to that.
+    """
+    starts = np.asarray(starts, dtype=np.intp)
+    states = starts.copy()
+    n = states.size
+    success = np.zeros(n, dtype=bool)
+    terminated = np.zeros(n, dtype=bool)
+    steps = np.zeros(n, dtype=int)
+    returns = np.zeros(n)
+    running = np.flatnonzero(~model.terminal[states])
+    discount = 1.0
+    for _ in range(max_steps):
+        actions = policy[states[running]]
+        # Stuck without any available action
+        running = running[actions >= 0]
+        actions = actions[actions >= 0]
+        if not running.size:
+            break
+        next_states = model.next_state[states[running], actions]
+        rewards = model.reward[states[running], actions]
+        states[running] = next_states
+        steps[running] += 1
+        returns[running] += discount * rewards
+        discount *= gamma
+        ended = model.terminal[next_states]
+        terminated[running[ended]] = True
+        success[running[ended]] = rewards[ended] > 0
+        running = running[~ended]
+    return Evaluation(starts, success, terminated, steps, returns, success.mean() if n else np.nan)
+
+
+def evaluate(env, q_table, starts=None, max_steps=None, gamma=1, model=None):
+    """ Evaluate the greedy policy of `q_table` on `env` without rendering
+
+        Parameters:
+            @env: Deterministic env, see `planning.build_model`
+            @q_table: QTable or Q array (states × actions) over the spaces of `env`
+            @starts: Start state indices, all non-terminal states if None
+            @max_steps: Step cap of every rollout, the number of states if None
+            @gamma: Discount of the returns
+            @model: Model of `env` if already built
+    """
+    if model is None:
+        model = build_model(env)
+    q_values = q_table.values if isinstance(q_table, QTable) else np.asarray(q_table)
+    if starts is None:
+        starts = np.flatnonzero(~model.terminal)
+    if max_steps is None:
+        max_steps = model.terminal.size
+    return rollout(model, greedy_policy(q_values, model.mask), starts, max_steps, gamma=gamma)
+
+
+def evaluate_files(q_files, envs, **kwargs):
+    """ Evaluate every Q file on every env, yield (Q file, env, Evaluation) """
+    models = [build_model(env) for env in envs]
+    for q_file in q_files:
+        for env, model in zip(envs, models):
+            q_table = QTable.read(q_file, env.observation_space, env.action_space)
+            yield q_file, env, evaluate(env, q_table, model=model, **kwargs)
+
+
+if __name__ == '__main__':
+    import config
+    from src.envs import envs
+
+    parser = argparse.ArgumentParser(description='Evaluate the greedy policies of Q files')
+    parser.add_argument('q_files', nargs='+', help='Q files, CSV or binary')
+    parser.add_argument('-m', '--maps', nargs='*', help='TreasureHunt2D map files, the configured env if not given')
+    parser.add_argument('-g', '--gamma', type=float, default=config.gamma)
+    parser.add_argument('-s', '--max-steps', type=int, default=None)
+    args = parser.parse_args()
+    if args.maps:
+        env_list = [envs["TreasureHunt2D"](mapfile=mapfile, save=False) for mapfile in args.maps]
+        names = args.maps
+    else:
+        env_list = [envs[config.env_name](**config.env_conf)]
+        names = [config.env_name]
+    names = dict(zip(map(id, env_list), names))
+    for q_file, env, evaluation in evaluate_files(args.q_files, env_list, gamma=args.gamma, max_steps=args.max_steps):
+        finished = evaluation.steps[evaluation.terminated]
+        print(f"{q_file} on {names[id(env)]}: success rate {evaluation.success_rate:.3f}, "
+              f"mean steps {finished.mean() if finished.size else float('nan'):.1f}, "
+              f"mean return {evaluation.returns.mean():.3f}, "
+              f"unfinished {(~evaluation.terminated).sum()}/{evaluation.starts.size}")
@@ -0,0 +1,252 @@
+""" Fused tabular TD episode kernels
+
+    One function runs whole episodes of any of the five algorithms over the
+    integer tables of an env (next_state, reward, terminal, valid_action_mask),
+    without per-step calls into the Agent or the env. It is compiled with numba
+    when it is installed, and otherwise runs as plain Python over lists, which
+    still skips the label lookups and method calls of `Agent.train_episode`.
+"""
+import math
+import random
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+compiled = njit is not None
+
+Q_LEARNING, SARSA, AVERAGE_SARSA, SARSA_LAMBDA, Q_LAMBDA = range(5)
+algorithm_codes = {
+    "Q_learning": Q_LEARNING,
+    "SARSA": SARSA,
+    "Average_SARSA": AVERAGE_SARSA,
+    "SARSA_lambda": SARSA_LAMBDA,
+    "Q_lambda": Q_LAMBDA,
+}
+
+# Termination criteria, see `convergence_value`
+NO_CRITERION, LOSS, MAX_DELTA, TD_ERROR = range(4)
+criterion_codes = {
+    "loss": LOSS,
+    "max_delta": MAX_DELTA,
+    "td_error": TD_ERROR,
+}
+
+
+def kernel(func):
+    return njit(cache=True)(func) if compiled else func
+
+
+def supports(env):
+    """ Whether the env has the tables the kernels run on """
+    return all(hasattr(env, name) for name in ("next_state", "reward", "terminal", "valid_action_mask"))
+
+
+@kernel
+def seed(value):
+    """ Seed the random generator used inside the kernels, numba keeps its own """
+    random.seed(value)
+
+
+@kernel
+def push_episode(history, seen, max_delta, td_square, td_count):
+    """ Record the statistics of an episode in the ring buffer `history`
+        Its rows are the max |ΔQ|, the sum of squared TD errors and the number of
+        TD errors of the last episodes, `seen[0]` counts the episodes recorded.
+    """
+    slot = seen[0] % history.shape[1]
+    history[0, slot] = max_delta
+    history[1, slot] = td_square
+    history[2, slot] = td_count
+    seen[0] += 1
+
+
+@kernel
+def convergence_value(criterion, history, seen, q_sum, prev_sum):
+    """ Value compared to the termination precision, infinite until it is defined
+            LOSS: |change of the Q sum| over the last episode
+            MAX_DELTA: Largest change of a single Q entry over the window
+            TD_ERROR: Root mean square TD error over the window
+    """
+    if criterion == LOSS:
+        return math.inf if math.isnan(prev_sum) else abs(q_sum - prev_sum)
+    if seen[0] < history.shape[1]:
+        return math.inf
+    if criterion == MAX_DELTA:
+        return history[0].max()
+    return math.sqrt(history[1].sum() / max(history[2].sum(), 1.0))
+
+
+@kernel
+def _choose(q, mask, state, n_actions, epsilon, available):
+    """ Epsilon-greedy action among the available ones, -1 if there is none """
+    base = state * n_actions
+    n = 0
+    for action in range(n_actions):
+        if mask[base + action]:
+            available[n] = action
+            n += 1
+    if n <= 1:
+        return available[0] if n else -1
+    if random.random() < epsilon:
+        return available[random.randrange(n)]
+    best = available[0]
+    for ind in range(1, n):
+        action = available[ind]
+        if q[base + action] > q[base + best]:
+            best = action
+    return best
+
+
+@kernel
+def run_episodes(
+    code, q, next_state, reward, terminal, mask, n_actions, start,
+    epsilons, alpha, gamma, lmd, cutoff, criterion, precision, total, prev_sum, history, seen,
+    trace, active, episode_reward, episode_steps, q_sum, episode_max_delta, episode_td_error,
+):
+    """ Train `len(epsilons)` episodes in place on the flat Q values `q`
+        The Q sum is kept up to date from `total`, the sum of `q`, with every
+        update. Stops early once the convergence value of `criterion` drops
+        below `precision`, `prev_sum` being the sum before the first episode
+        (NaN if unknown). Returns the number of episodes done.
+    """
+    available = [0] * n_actions
+    n_active = 0
+    for episode in range(len(epsilons)):
+        epsilon = epsilons[episode]
+        for ind in range(n_active):
+            trace[active[ind]] = 0.0
+        n_active = 0
+        state = start
+        action = _choose(q, mask, state, n_actions, epsilon, available)
+        total_reward = 0.0
+        steps = 0
+        max_delta = 0.0
+        td_square = 0.0
+        done = action < 0
+        while not done:
+            entry = state * n_actions + action
+            n_state = next_state[entry]
+            r = reward[entry]
+            done = terminal[n_state]
+            total_reward += r
+            steps += 1
+            n_action = -1
+            exploration = True
+            if not done:
+                n_action = _choose(q, mask, n_state, n_actions, epsilon, available)
+                # A state without any available move ends the episode too
+                done = n_action < 0
+            if done:
+                td_target = r
+            else:
+                base = n_state * n_actions
+                if code == SARSA or code == SARSA_LAMBDA:
+                    target_q = q[base + n_action]
+                elif code == AVERAGE_SARSA:
+                    target_q = 0.0
+                    for ind in range(n_actions):
+                        target_q += q[base + ind]
+                    target_q /= n_actions
+                else:
+                    target_q = q[base]
+                    for ind in range(1, n_actions):
+                        target_q = max(target_q, q[base + ind])
+                    exploration = target_q != q[base + n_action]
+                td_target = r + gamma * target_q
+            td_error = td_target - q[entry]
+            td_square += td_error * td_error
+            step = alpha * td_error
+            if code == SARSA_LAMBDA or code == Q_LAMBDA:
+                if trace[entry] == 0:
+                    active[n_active] = entry
+                    n_active += 1
+                trace[entry] += 1.0
+                largest = 0.0
+                for ind in range(n_active):
+                    delta = step * trace[active[ind]]
+                    q[active[ind]] += delta
+                    total += delta
+                    largest = max(largest, trace[active[ind]])
+                max_delta = max(max_delta, abs(step) * largest)
+                if code == Q_LAMBDA and exploration:
+                    for ind in range(n_active):
+                        trace[active[ind]] = 0.0
+                    n_active = 0
+                else:
+                    keep = 0
+                    for ind in range(n_active):
+                        value = trace[active[ind]] * gamma * lmd
+                        if (value >= cutoff) if cutoff > 0 else (value != 0):
+                            trace[active[ind]] = value
+                            active[keep] = active[ind]
+                            keep += 1
+                        else:
+                            trace[active[ind]] = 0.0
+                    n_active = keep
+            else:
+                q[entry] += step
+                total += step
+                max_delta = max(max_delta, abs(step))
+            state, action = n_state, n_action
+        episode_reward[episode] = total_reward
+        episode_steps[episode] = steps
+        q_sum[episode] = total
+        episode_max_delta[episode] = max_delta
+        episode_td_error[episode] = math.sqrt(td_square / steps) if steps else 0.0
+        push_episode(history, seen, max_delta, td_square, steps)
+        if criterion != NO_CRITERION and convergence_value(criterion, history, seen, total, prev_sum) < precision:
+            return episode + 1
+        prev_sum = total
+    return len(epsilons)
+
+
+def train_episodes(env, q_values, start, algorithm, epsilons, alpha, gamma, tracker, lmd=0.9, cutoff=1e-6, criterion=None, precision=0.0):
+    """ Run the kernel on the tables of `env`, updating `q_values` (states × actions) in place
+        `tracker` is the ConvergenceTracker of the training, brought up to date
+        and `criterion` one of `criterion_codes` or None.
+        Returns the number of episodes done and a dict of per-episode arrays
+        "episode_total_reward", "episode_steps", "q_sum", "max_delta" and "td_error".
+    """
+    n_states, n_actions = q_values.shape
+    n = len(epsilons)
+    stats = {
+        "episode_total_reward": np.zeros(n),
+        "episode_steps": np.zeros(n, dtype=int),
+        "q_sum": np.zeros(n),
+        "max_delta": np.zeros(n),
+        "td_error": np.zeros(n),
+    }
+    tables = (
+        env.next_state.reshape(-1),
+        env.reward.reshape(-1),
+        env.terminal,
+        env.valid_action_mask.reshape(-1),
+    )
+    if compiled:
+        q = np.ascontiguousarray(q_values).reshape(-1)
+        trace = np.zeros(q.size)
+        active = np.zeros(q.size, dtype=np.intp)
+        epsilons = np.asarray(epsilons, dtype=float)
+    else:
+        # Python scalars index and add much faster than NumPy ones
+        q = q_values.reshape(-1).tolist()
+        tables = tuple(table.tolist() for table in tables)
+        trace = [0.0] * len(q)
+        active = [0] * len(q)
+    done = run_episodes(
+        algorithm_codes[algorithm], q, *tables, n_actions, start,
+        epsilons, alpha, gamma, lmd, cutoff, criterion_codes.get(criterion, NO_CRITERION), precision,
+        tracker.q_sum, tracker.prev_sum, tracker.history, tracker.seen,
+        trace, active, *stats.values(),
+    )
+    q_sum = stats["q_sum"]
+    if done:
+        tracker.prev_sum = q_sum[done - 2] if done > 1 else tracker.q_sum
+        tracker.q_sum = q_sum[done - 1]
+    if not compiled or not np.shares_memory(q, q_values):
+        q_values[...] = np.reshape(q, q_values.shape)
+    return done, {name: values[:done] for name, values in stats.items()}
@@ -0,0 +1,146 @@
+import argparse
+import collections
+
+import numpy as np
+
+from src.AI.qtable import QTable
+
+# Deterministic MDP over integer states and actions
+#   next_state[s, a]: Next state, -1 if `a` is not available in `s`
+#   reward[s, a]: Reward of the transition
+#   terminal[s]: Whether an episode ends when entering `s`
+#   mask[s, a]: Whether `a` is available in `s`
+Model = collections.namedtuple("Model", ["next_state", "reward", "terminal", "mask"])
+
+
+def build_model(env):
+    """ Transition and reward matrices of a deterministic env
+        Uses the compiled tables of the env when it has them (TreasureHunt2D),
+        otherwise probes every (state, action) pair once with `env.step`.
+    """
+    if hasattr(env, "next_state") and hasattr(env, "valid_action_mask"):
+        return Model(env.next_state, env.reward, env.terminal, env.valid_action_mask)
+    states, actions = env.observation_space, env.action_space
+    state_index = {state: ind for ind, state in enumerate(states)}
+    action_filter = getattr(env, "action_filter", lambda state: actions)
+    shape = (len(states), len(actions))
+    next_state = np.full(shape, -1, dtype=np.intp)
+    reward = np.zeros(shape)
+    terminal = np.zeros(shape[0], dtype=bool)
+    for s, state in enumerate(states):
+        available = action_filter(state)
+        for a, action in enumerate(actions):
+            if action not in available:
+                continue
+            env.observation = state
+            n_state, r, done, info = env.step(action)
+            n_ind = state_index.get(n_state)
+            if n_ind is None:
+                continue
+            next_state[s, a], reward[s, a] = n_ind, r
+            terminal[n_ind] |= done
+    env.reset()
+    return Model(next_state, reward, terminal, next_state >= 0)
+
+
+def _bootstrap(model, gamma, values):
+    """ r + γ·V(s') with V(s') = 0 for terminal and unavailable moves """
+    next_state = np.maximum(model.next_state, 0)
+    cont = np.where(model.mask & ~model.terminal[next_state], values[next_state], 0)
+    return model.reward + gamma * cont
+
+
+def _greedy_values(model, q):
+    masked = np.where(model.mask, q, -np.inf)
+    values = masked.max(axis=1)
+    # States without any available move (or terminal ones) are worth nothing
+    values[~np.isfinite(values) | model.terminal] = 0
+    return values
+
+
+def _finish(model, q, fill_value):
+    q = np.where(model.mask, q, fill_value)
+    q[model.terminal] = fill_value
+    return q
+
+
+def value_iteration(model, gamma=1, tol=1e-8, max_iterations=100000):
+    """ Optimal Q values by vectorized value iteration
+        Returns the Q array and the number of sweeps done.
+    """
+    values = np.zeros(model.terminal.shape)
+    for iteration in range(1, max_iterations + 1):
+        q = _bootstrap(model, gamma, values)
+        new_values = _greedy_values(model, q)
+        delta = np.abs(new_values - values).max()
+        values = new_values
+        if delta < tol:
+            break
+    return q, iteration
+
+
+def policy_iteration(model, gamma=1, tol=1e-8, max_iterations=1000, max_evaluations=100000):
+    """ Optimal Q values by policy iteration with iterative policy evaluation
+        Evaluation stops after `max_evaluations` sweeps, so that improper (looping)
+        policies under γ = 1 get very low values instead of never finishing.
+        Returns the Q array and the number of improvement steps done.
+    """
+    states = np.arange(model.terminal.size)
+    # Start from the first available action of every state
+    policy = model.mask.argmax(axis=1)
+    values = np.zeros(model.terminal.shape)
+    for iteration in range(1, max_iterations + 1):
+        next_state = np.maximum(model.next_state[states, policy], 0)
+        reward = model.reward[states, policy]
+        active = model.mask[states, policy] & ~model.terminal
+        stop = ~model.terminal[next_state]
+        for _ in range(max_evaluations):
+            new_values = np.where(active, reward + gamma * np.where(stop, values[next_state], 0), 0)
+            delta = np.abs(new_values - values).max()
+            values = new_values
+            if delta < tol:
+                break
+        q = _bootstrap(model, gamma, values)
+        new_policy = np.where(model.mask, q, -np.inf).argmax(axis=1)
+        # Keep the current action on ties so the loop ends
+        keep = q[states, policy] >= q[states, new_policy]
+        new_policy = np.where(keep, policy, new_policy)
+        if (new_policy == policy).all():
+            break
+        policy = new_policy
+    return q, iteration
+
+
+methods = {
+    "value_iteration": value_iteration,
+    "policy_iteration": policy_iteration,
+}
+
+
+def solve(env, method="value_iteration", gamma=1, fill_value=0, **kwargs):
+    """ Optimal Q table of a known deterministic env
+        Unavailable actions and terminal states get `fill_value`, as untouched
+        entries of a zero-initialized Agent Q table do.
+    """
+    model = build_model(env)
+    q, iterations = methods[method](model, gamma=gamma, **kwargs)
+    return QTable(env.observation_space, env.action_space, _finish(model, q, fill_value))
+
+
+def q_error(q_values, q_star, model):
+    """ Max-norm distance to the optimal Q values over the available moves of non-terminal states """
+    relevant = model.mask & ~model.terminal[:, np.newaxis]
+    return np.abs(np.where(relevant, q_values - q_star, 0)).max()
+
+
+if __name__ == '__main__':
+    import config
+    from src.envs import envs
+
+    parser = argparse.ArgumentParser(description='Solve the Q table of the configured env by planning')
+    parser.add_argument('-m', '--method', choices=list(methods), default='value_iteration')
+    parser.add_argument('-g', '--gamma', type=float, default=config.gamma)
+    parser.add_argument('-o', '--output', help='Q file, CSV for a .csv suffix and binary otherwise', default='Q.csv')
+    args = parser.parse_args()
+    env = envs[config.env_name](**config.env_conf)
+    solve(env, method=args.method, gamma=args.gamma).dump(args.output, env_name=env.name)
@@ -0,0 +1,95 @@
+import os
+import json
+import time
+import pathlib
+
+phases = ("render", "policy", "env.step", "update", "trace", "io")
+
+
+class PhaseProfiler:
+    def __init__(self, record_events=False):
+        """ Per-phase timers and counters of the training loop
+            The Agent only calls into the profiler when profiling is enabled, so a
+            disabled profiler costs one `is None` check per phase.
+
+            Parameters:
+                @record_events: Keep every timed interval for `export_chrome_trace`
+        """
+        self.clock = time.perf_counter
+        self.origin = self.clock()
+        self.episodes = []
+        self.events = [] if record_events else None
+        self.start_episode()
+
+    def start_episode(self):
+        self.seconds = dict.fromkeys(phases, 0.0)
+        self.counts = dict.fromkeys(phases, 0)
+        self.episode_start = self.last = self.clock()
+
+    def lap(self, phase):
+        """ Charge the time since the previous lap to `phase` """
+        now = self.clock()
+        self.seconds[phase] += now - self.last
+        self.counts[phase] += 1
+        if self.events is not None:
+            self.events.append((phase, self.last, now))
+        self.last = now
+
+    def end_episode(self):
+        """ Close the current episode and return its record """
+        end = self.clock()
+        record = {
+            "seconds": end - self.episode_start,
+            "phases": {
+                phase: {"seconds": self.seconds[phase], "count": self.counts[phase]}
+                for phase in phases
+            },
+        }
+        if self.events is not None:
+            self.events.append(("episode", self.episode_start, end))
+        self.episodes.append(record)
+        self.start_episode()
+        return record
+
+    def totals(self):
+        return {
+            phase: {
+                "seconds": sum(e["phases"][phase]["seconds"] for e in self.episodes),
+                "count": sum(e["phases"][phase]["count"] for e in self.episodes),
+            }
+            for phase in phases
+        }
+
+    def export_chrome_trace(self, file_name):
+        """ Write the recorded intervals in the Chrome trace event format (chrome://tracing, Perfetto) """
+        if self.events is None:
+            raise ValueError("Chrome traces need a profiler created with record_events=True")
+        pid = os.getpid()
+        events = [
+            {
+                "name": name,
+                "cat": "train",
+                "ph": "X",
+                "ts": (start - self.origin) * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": pid,
+                "tid": 0,
+            }
+            for name, start, end in self.events
+        ]
+        pathlib.Path(file_name).write_text(json.dumps({"traceEvents": events}))
+
+    def export_collapsed(self, file_name):
+        """ Write the phase totals as collapsed stacks in microseconds (flamegraph.pl, speedscope) """
+        totals = self.totals()
+        other = sum(e["seconds"] for e in self.episodes) - sum(t["seconds"] for t in totals.values())
+        lines = [f"train;episode;{phase} {round(t['seconds'] * 1e6)}" for phase, t in totals.items()]
+        lines.append(f"train;episode {max(round(other * 1e6), 0)}")
+        pathlib.Path(file_name).write_text('\n'.join(lines) + '\n')
+
+    def export(self, file_name):
+        """ Chrome trace for a .json file, collapsed stacks otherwise """
+        if pathlib.Path(file_name).suffix == '.json':
+            self.export_chrome_trace(file_name)
+        else:
+            self.export_collapsed(file_name)
@@ -0,0 +1,208 @@
+import json
+import struct
+import pathlib
+from itertools import product
+
+import numpy as np
+
+# Binary layout: magic, little-endian uint32 header length, JSON header,
+# padding up to a multiple of 64 bytes, then the raw C-ordered values
+BINARY_MAGIC = b"\x93QTABLE\x01"
+BINARY_ALIGN = 64
+
+
+class QTable:
+    def __init__(self, states, actions, values=None, dtype=np.float64):
+        """ Dense Q table backed by a NumPy array
+            Rows follow the order of `states` and columns the order of `actions`,
+            which is the same layout as the CSV files written by the Agent.
+
+            Parameters:
+                @states: All states (observation space) of the environment
+                @actions: All actions (action space) of the environment
+                @values: Initial values with shape (len(states), len(actions))
+                @dtype: Data type of the Q values
+        """
+        self.states = states
+        self.actions = actions
+        self.shape = (len(states), len(actions))
+        self.state_index = self._build_index(states)
+        self.action_index = self._build_index(actions)
+        if values is None:
+            values = np.zeros(self.shape, dtype=dtype)
+        self.values = np.asarray(values, dtype=dtype)
+        if self.values.shape != self.shape:
+            raise ValueError(f"Q values of shape {self.values.shape} do not match {self.shape}")
+        self.at = _AtIndexer(self)
+
+    @staticmethod
+    def _build_index(labels):
+        if isinstance(labels, range) and labels.start == 0 and labels.step == 1:
+            # Integer encoded labels are their own index, range(n)[i] == i
+            return labels
+        index = {label: ind for ind, label in enumerate(labels)}
+        # One-element state tuples can also be addressed by the bare value,
+        # as a one-level pandas MultiIndex allows
+        for label, ind in list(index.items()):
+            if isinstance(label, tuple) and len(label) == 1:
+                index.setdefault(label[0], ind)
+        return index
+
+    def row(self, state):
+        return self.state_index[state]
+
+    def col(self, action):
+        return self.action_index[action]
+
+    def cols(self, actions):
+        return [self.action_index[a] for a in actions]
+
+    def __getitem__(self, ind):
+        state, action = ind
+        return self.values[self.state_index[state], self.action_index[action]]
+
+    def __setitem__(self, ind, value):
+        state, action = ind
+        self.values[self.state_index[state], self.action_index[action]] = value
+
+    def max(self, state):
+        return self.values[self.state_index[state]].max()
+
+    def mean(self, state):
+        return self.values[self.state_index[state]].mean()
+
+    def argmax(self, state, available=None):
+        """ Action with the maximum Q value in `state`, among `available` if given """
+        row = self.values[self.state_index[state]]
+        if available:
+            cols = self.cols(available)
+            return available[int(row[cols].argmax())]
+        return self.actions[int(row.argmax())]
+
+    def sum(self):
+        return self.values.sum()
+
+    def fill(self, value):
+        self.values.fill(value)
+
+    def copy(self):
+        return QTable(self.states, self.actions, self.values.copy(), dtype=self.values.dtype)
+
+    def to_dataframe(self):
+        """ Build a pandas DataFrame of the table for inspection """
+        import pandas as pd
+        if isinstance(self.states[0], tuple):
+            index = pd.MultiIndex.from_tuples(self.states)
+        else:
+            index = pd.Index(self.states)
+        return pd.DataFrame(
+            self.values.copy(),
+            index=index,
+            columns=list(self.actions),
+        )
+
+    def to_csv(self, file_name):
+        np.savetxt(file_name, self.values, delimiter=',', fmt='%.17g')
+
+    @classmethod
+    def from_csv(cls, file_name, states, actions, dtype=np.float64):
+        values = np.loadtxt(file_name, delimiter=',', dtype=dtype, ndmin=2)
+        return cls(states, actions, values, dtype=dtype)
+
+    def save(self, file_name, env_name=None):
+        """ Write the table in the binary format that `load` can memory-map """
+        header = {
+            "env": env_name,
+            "dtype": self.values.dtype.str,
+            "shape": list(self.shape),
+            "states": _encode_labels(self.states),
+            "actions": _encode_labels(self.actions),
+        }
+        header = json.dumps(header).encode()
+        prefix = len(BINARY_MAGIC) + 4 + len(header)
+        header += b" " * (-prefix % BINARY_ALIGN)
+        with open(file_name, 'wb') as f:
+            f.write(BINARY_MAGIC)
+            f.write(struct.pack('<I', len(header)))
+            f.write(header)
+            np.ascontiguousarray(self.values).tofile(f)
+
+    @staticmethod
+    def read_header(file_name):
+        """ Header of a binary Q table and the offset of its values """
+        with open(file_name, 'rb') as f:
+            if f.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+                raise ValueError(f"{file_name} is not a binary Q table")
+            length, = struct.unpack('<I', f.read(4))
+            header = json.loads(f.read(length))
+        return header, len(BINARY_MAGIC) + 4 + length
+
+    @classmethod
+    def load(cls, file_name, states=None, actions=None, mmap_mode='c'):
+        """ Open a binary Q table without copying it
+            With the default copy-on-write mode, processes opening the same file share
+            its pages until they modify them; use mmap_mode='r' for read-only access.
+
+            Parameters:
+                @states, actions: Labels of the table, read from the header if not given
+                @mmap_mode: Mode of np.memmap, or None to read the values into memory
+        """
+        header, offset = cls.read_header(file_name)
+        shape = tuple(header["shape"])
+        if states is None:
+            states = _decode_labels(header["states"])
+        if actions is None:
+            actions = _decode_labels(header["actions"])
+        if (len(states), len(actions)) != shape:
+            raise ValueError(f"Q table in {file_name} has shape {shape}, expected {(len(states), len(actions))}")
+        dtype = np.dtype(header["dtype"])
+        if mmap_mode is None:
+            values = np.fromfile(file_name, dtype=dtype, offset=offset).reshape(shape)
+        else:
+            values = np.memmap(file_name, dtype=dtype, mode=mmap_mode, offset=offset, shape=shape)
+        return cls(states, actions, values, dtype=dtype)
+
+    def dump(self, file_name, env_name=None):
+        """ Write to `file_name`, as CSV for a .csv suffix and in the binary format otherwise """
+        if pathlib.Path(file_name).suffix == '.csv':
+            self.to_csv(file_name)
+        else:
+            self.save(file_name, env_name=env_name)
+
+    @classmethod
+    def read(cls, file_name, states, actions):
+        """ Read a table written by `dump` """
+        if pathlib.Path(file_name).suffix == '.csv':
+            return cls.from_csv(file_name, states, actions)
+        return cls.load(file_name, states, actions)
+
+
+def _encode_labels(labels):
+    if isinstance(labels, range) and labels.start == 0 and labels.step == 1:
+        return {"range": len(labels)}
+    first = labels[0]
+    if isinstance(first, tuple) and all(isinstance(x, int) for x in first):
+        grid = [x + 1 for x in labels[-1]]
+        if len(labels) == np.prod(grid) and all(a == b for a, b in zip(labels, product(*map(range, grid)))):
+            return {"grid": grid}
+    return {"labels": [list(x) if isinstance(x, tuple) else x for x in labels]}
+
+
+def _decode_labels(layout):
+    if "range" in layout:
+        return range(layout["range"])
+    if "grid" in layout:
+        return list(product(*map(range, layout["grid"])))
+    return [tuple(x) if isinstance(x, list) else x for x in layout["labels"]]
+
+
+class _AtIndexer:
+    """ Label based scalar access, mirroring `DataFrame.at` """
+    def __init__(self, table):
+        self.table = table
+
+    def __getitem__(self, ind):
+        return self.table[ind]
+
+    def __setitem__(self, ind, value):
+        self.table[ind] = value
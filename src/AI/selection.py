@@ -0,0 +1,85 @@
+import random
+
+import numpy as np
+
+
+class ActionSelector:
+    def __init__(self, q_values, mask=None):
+        """ Greedy and epsilon-greedy choice over a Q array with cached per-state maxima
+            Keeps, for every state, the best available action and the maximum over
+            all actions. Call `update` after changing one Q entry and `refresh`
+            after changing many, unchanged states then cost O(1).
+            Ties go to the lowest action index, as `QTable.argmax` does.
+
+            Parameters:
+                @q_values: Q array (states × actions), read in place
+                @mask: Boolean array of the available actions, all actions if None
+        """
+        self.q_values = q_values
+        n_states, n_actions = q_values.shape
+        if mask is None:
+            mask = np.ones(q_values.shape, dtype=bool)
+        # A state without any available action falls back to all of them
+        self.mask = mask | ~mask.any(axis=1, keepdims=True)
+        columns = np.arange(n_actions)
+        self.available = [columns[row].tolist() for row in self.mask]
+        self.refresh()
+
+    def refresh(self, rows=None):
+        """ Recompute the cache of `rows` (all states if None) """
+        q_values = self.q_values
+        if rows is None:
+            rows = np.arange(q_values.shape[0])
+            self.best, self.best_value = [0] * rows.size, [0.0] * rows.size
+            self.max_action, self.max_value = [0] * rows.size, [0.0] * rows.size
+        q = q_values[rows]
+        masked = np.where(self.mask[rows], q, -np.inf)
+        best = masked.argmax(axis=1)
+        max_action = q.argmax(axis=1)
+        for row, b, bv, m, mv in zip(
+            rows.tolist(), best.tolist(), masked[np.arange(len(rows)), best].tolist(),
+            max_action.tolist(), q[np.arange(len(rows)), max_action].tolist(),
+        ):
+            self.best[row], self.best_value[row] = b, bv
+            self.max_action[row], self.max_value[row] = m, mv
+
+    def refresh_entries(self, entries):
+        """ Recompute the states of the flat Q indices `entries` """
+        if len(entries):
+            self.refresh(np.unique(np.asarray(entries) // self.q_values.shape[1]))
+
+    def _refresh_row(self, row):
+        values = self.q_values[row].tolist()
+        max_value = max(values)
+        self.max_action[row], self.max_value[row] = values.index(max_value), max_value
+        best = self.available[row][0]
+        for col in self.available[row]:
+            if values[col] > values[best]:
+                best = col
+        self.best[row], self.best_value[row] = best, values[best]
+
+    def update(self, row, col):
+        """ Account for a new value of the single entry (row, col) """
+        value = self.q_values[row, col]
+        if (col == self.best[row] and value < self.best_value[row]) or (
+                col == self.max_action[row] and value < self.max_value[row]):
+            self._refresh_row(row)
+            return
+        if self.mask[row, col]:
+            best_value = self.best_value[row]
+            if value > best_value or (value == best_value and col < self.best[row]):
+                self.best[row], self.best_value[row] = col, value
+        max_value = self.max_value[row]
+        if value > max_value or (value == max_value and col < self.max_action[row]):
+            self.max_action[row], self.max_value[row] = col, value
+
+    def greedy(self, row):
+        return self.best[row]
+
+    def epsilon_greedy(self, row, epsilon):
+        available = self.available[row]
+        if len(available) == 1:
+            return available[0]
+        if np.random.uniform() < epsilon:
+            return random.choice(available)
+        return self.best[row]
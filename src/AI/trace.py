@@ -0,0 +1,45 @@
+import numpy as np
+
+
+class EligibilityTrace:
+    def __init__(self, shape, cutoff=1e-6):
+        """ Accumulating eligibility trace over a Q table
+            Only entries whose trace is at least `cutoff` are kept in the active
+            set, so one update costs O(trace length) instead of O(|S|·|A|).
+
+            Parameters:
+                @shape: Shape of the Q table, (number of states, number of actions)
+                @cutoff: Traces decayed below this value are dropped (0 keeps all)
+        """
+        self.shape = shape
+        self.cutoff = cutoff
+        self.values = np.zeros(shape)
+        self._flat = self.values.reshape(-1)
+        self.active = np.empty((0,), dtype=np.intp)
+
+    def __len__(self):
+        return self.active.size
+
+    def visit(self, row, col):
+        ind = row * self.shape[1] + col
+        if self._flat[ind] == 0:
+            self.active = np.append(self.active, ind)
+        self._flat[ind] += 1
+
+    def update(self, q_values, step):
+        """ Q += step * E over the active entries, `step` being alpha·δ
+            Returns the changes of the active entries.
+        """
+        deltas = step * self._flat[self.active]
+        q_values.flat[self.active] += deltas
+        return deltas
+
+    def decay(self, factor):
+        traces = self._flat[self.active] * factor
+        keep = traces >= self.cutoff if self.cutoff else traces != 0
+        self._flat[self.active] = np.where(keep, traces, 0)
+        self.active = self.active[keep]
+
+    def clear(self):
+        self._flat[self.active] = 0
+        self.active = self.active[:0]
@@ -35,12 +35,41 @@ class Result:
         self.met_ind = dict(zip(self.metrics, range(self.met_len)))
         self.max_train_episodes = max_train_episodes
         self.metric_values = np.zeros((self.alg_len, self.obj_len, self.met_len, self.max_train_episodes))
+        self._shm = None
         self._short_name_dict = {
             "alg": "algorithms",
             "var": "objective_values",
             "met": "metrics",
         }
 
+    def share(self):
+        """ Move metric_values into shared memory so that worker processes can fill it
+            Returns the name of the shared memory block, see `attach_metric_values`.
+        """
+        from multiprocessing import shared_memory
+        self._shm = shared_memory.SharedMemory(create=True, size=self.metric_values.nbytes)
+        values = np.ndarray(self.metric_values.shape, dtype=self.metric_values.dtype, buffer=self._shm.buf)
+        values[:] = self.metric_values
+        self.metric_values = values
+        return self._shm.name
+
+    def unshare(self):
+        """ Copy metric_values back to private memory and release the shared block """
+        if self._shm is not None:
+            self.metric_values = self.metric_values.copy()
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    @staticmethod
+    def attach_metric_values(name, shape, dtype=np.float64):
+        """ Open the metric_values of a shared Result from another process
+            Returns the shared memory block, to be closed by the caller, and the array view.
+        """
+        from multiprocessing import shared_memory
+        shm = shared_memory.SharedMemory(name=name)
+        return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
     def __getattr__(self, short_name):
         return super().__getattr__(self, self._short_name_dict[short_name])
 
@@ -0,0 +1,111 @@
+import os
+import time
+import random
+import pathlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import config
+from src.analysis import Result
+
+
+def agent_kwargs_from_config(conf=config):
+    """ Agent parameters shared by every cell of a sweep """
+    return {
+        "max_train_episodes": conf.max_train_episodes,
+        "epsilon_base": conf.epsilon_base,
+        "epsilon_decay_rate": conf.epsilon_decay_rate,
+        "gamma": conf.gamma,
+        "learning_rate": conf.learning_rate,
+        "lmd": conf.lmd,
+        "initial_q_mode": conf.init_q_mode,
+        "info_episodes": conf.info_episodes,
+        **conf.train_render_config,
+        **conf.train_termination_config,
+        **conf.checkpoint_config,
+    }
+
+
+def _run_cell(cell):
+    """ Train one (algorithm, objective value) cell and write its metrics into the shared Result """
+    from src.envs import envs
+    from src.AI.agent import Agent
+
+    random.seed(cell["seed"])
+    np.random.seed(cell["seed"])
+    env = envs[cell["env_name"]](**cell["env_conf"])
+    result_path = cell["result_path"] / f"{cell['evaluation_objective']}={cell['objective_value']}"
+    result_path.mkdir(parents=True, exist_ok=True)
+    agent = Agent(
+        env=env,
+        q_file=result_path / f"{env.name}-{cell['algorithm']}-Q.csv",
+        **{**cell["agent_kwargs"], cell["evaluation_objective"]: cell["objective_value"]},
+    )
+    agent.result_path = result_path
+    start = time.time()
+    train_result = agent.train(algorithm=cell["algorithm"])
+    shm, metric_values = Result.attach_metric_values(cell["shm_name"], cell["shape"])
+    try:
+        for m_ind, metric in enumerate(cell["metrics"]):
+            metric_values[cell["alg_ind"], cell["obj_ind"], m_ind, :] = train_result[metric]
+    finally:
+        del metric_values
+        shm.close()
+    return cell["algorithm"], cell["objective_value"], train_result["episode_number"], time.time() - start
+
+
+def sweep(conf=config, max_workers=None, seed=0, result_path=pathlib.Path("results")):
+    """ Train every algorithm with every objective value in parallel
+        Each cell of the algorithms × objective_values grid runs in its own process
+        with its own environment and Agent, seeded with `seed`, and writes its
+        metrics straight into the shared-memory backed Result.metric_values.
+
+        Parameters:
+            @conf: Module or object with the same fields as `config`
+            @max_workers: Number of worker processes, default to the number of CPUs
+            @seed: Seed of `random` and `np.random` in every worker
+            @result_path: Directory of the Q tables and logs of every cell
+    """
+    result = Result(
+        algorithms=conf.algorithms,
+        evaluation_objective=conf.evaluation_objective,
+        objective_values=conf.objective_values,
+        metrics=conf.metrics,
+        max_train_episodes=conf.max_train_episodes,
+    )
+    shm_name = result.share()
+    agent_kwargs = agent_kwargs_from_config(conf)
+    cells = [
+        {
+            "algorithm": alg,
+            "objective_value": obj,
+            "alg_ind": result.alg_ind[alg],
+            "obj_ind": result.obj_ind[obj],
+            "evaluation_objective": conf.evaluation_objective,
+            "metrics": conf.metrics,
+            "env_name": conf.env_name,
+            "env_conf": conf.env_conf,
+            "agent_kwargs": agent_kwargs,
+            "seed": seed,
+            "result_path": pathlib.Path(result_path),
+            "shm_name": shm_name,
+            "shape": result.metric_values.shape,
+        }
+        for alg in conf.algorithms for obj in conf.objective_values
+    ]
+    total = len(cells)
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+            futures = [executor.submit(_run_cell, cell) for cell in cells]
+            for finished, future in enumerate(as_completed(futures), start=1):
+                alg, obj, episode_number, elapsed = future.result()
+                print(f"Sweep progress: {finished}/{total}, algorithm: {alg}, "
+                      f"{conf.evaluation_objective} = {obj}, episodes: {episode_number}, time: {elapsed:.2f}s")
+    finally:
+        result.unshare()
+    return result
+
+
+if __name__ == '__main__':
+    print(sweep())
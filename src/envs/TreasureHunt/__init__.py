@@ -20,14 +20,16 @@ oprint = functools.partial(cprint, color='b', bcolor='k', end='')
 tprint = functools.partial(cprint, color='r', bcolor='k', end='')
 
 class TreasureHunt:
-    def __init__(self, size=10):
+    def __init__(self, size=10, encoded=False):
         self.size = size
         self.name = "TreasureHunt1D"
-        self.observation_space = [(i, ) for i in range(self.size)]
+        # In encoded mode states and actions are integer ids, see `encode_state` and `encode_action`
+        self.encoded = encoded
+        self.positions = [(i, ) for i in range(self.size)]
         # Positions
-        self.treasure_pos = self.observation_space[-1]
-        self.trap_pos = self.observation_space[0]
-        self.observation = self.reset() # initial position
+        self.treasure_pos = self.positions[-1]
+        self.trap_pos = self.positions[0]
+        self.reset() # initial position
         # Rewards
         self.win_reward = 10
         self.lose_reward = -10
@@ -43,14 +45,21 @@ class TreasureHunt:
         self.path_sign = '_'
         self.left = -1
         self.right = 1
-        self.action_space = [self.left, self.right]
+        self.moves = [self.left, self.right]
+        self.move_index = {move: ind for ind, move in enumerate(self.moves)}
+        if self.encoded:
+            self.observation_space = range(self.size)
+            self.action_space = range(len(self.moves))
+        else:
+            self.observation_space = self.positions
+            self.action_space = self.moves
         self.custom_params = {
             'show': self.render,
         }
 
     def render(self, mode="human"):
         if mode == "human":
-            pstate = self.observation
+            pstate = self.position
             for i in range(self.size):
                 if i == pstate[0]:
                     oprint(self.warrior_sign)
@@ -64,18 +73,40 @@ class TreasureHunt:
         else:
             pass
 
+    def encode_state(self, pos):
+        return pos[0]
+
+    def decode_state(self, state):
+        return (state, )
+
+    def encode_action(self, move):
+        return self.move_index[move]
+
+    def decode_action(self, action):
+        return self.moves[action]
+
+    @property
+    def observation(self):
+        return self.position[0] if self.encoded else self.position
+
+    @observation.setter
+    def observation(self, observation):
+        self.position = self.decode_state(observation) if self.encoded else observation
+
     def step(self, action: int):
-        self.observation = next_state = (self.observation[0] + action, )
+        if self.encoded:
+            action = self.moves[action]
+        self.position = next_state = (self.position[0] + action, )
         reward = self.reward_func.get(next_state, self.wander_reward)
         if reward == self.wander_reward:
             done = False
         else:
             done = True
         info = {}
-        return next_state, reward, done, info
+        return self.observation, reward, done, info
 
     def reset(self):
-        self.observation = self.observation_space[int(self.size/2)]
+        self.position = self.positions[int(self.size/2)]
         return self.observation
 
     def close(self):
@@ -91,7 +122,7 @@ class TreasureHunt:
         while not done:
             action = random.choice(self.action_space)
             next_state, reward, done, info = self.step(action)
-            self.observation = state = next_state
+            state = next_state
             self.render()
 
 
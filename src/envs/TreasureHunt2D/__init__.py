@@ -7,8 +7,8 @@ df = pd.DataFrame
 import functools
 import time
 from itertools import product
-from collections import OrderedDict
 from pprint import pprint
+from .cells import CellSet
 from math import sqrt
 import pdb
 
@@ -35,75 +35,97 @@ def add_tuple(a, b):
 
 class TreasureHunt2D:
     @staticmethod
-    def gen_randmap(size):
-        randmap = df(
-            np.zeros(size),
-            dtype=np.int32
-        )
-        all_coordinates = [(x, y) for x, y in product(range(size[0]), range(size[1]))]
-        cp_allcs = all_coordinates[:]
-        treasure_point = all_coordinates.pop()  # Treasure point at the bottom-right
-        all_coordinates.pop(0)  # Warrior at top-left
-        randmap.at[treasure_point] = 2
-        wall_count = min(size) - 3
-        trap_count = wall_count + 1
-        trap_points = []
-        wall_points = []
-        for x in range(wall_count + trap_count):
-            coor = random.choice(all_coordinates)
-            if x < wall_count:
-                wall_points.append(coor)
-                randmap.at[coor] = 1
-            else:
-                trap_points.append(coor)
-                randmap.at[coor] = -1
+    def gen_grid(size, wall_density=None, trap_density=None):
+        """ Random int8 map grid with the warrior at the top-left and the treasure at the bottom-right
+            Walls and traps are sampled without replacement among the other cells.
+
+            Parameters:
+                @size: (height, width) of the map
+                @wall_density: Fraction of the other cells that are walls, `min(size) - 3` walls if None
+                @trap_density: Fraction of the other cells that are traps, one more than the walls if None
+        """
+        height, width = size
+        cells = height * width
+        # Neither the start nor the treasure cell
+        candidates = cells - 2
+        if wall_density is None:
+            wall_count = max(min(size) - 3, 0)
+        else:
+            wall_count = int(round(wall_density * candidates))
+        if trap_density is None:
+            trap_count = wall_count + 1
+        else:
+            trap_count = int(round(trap_density * candidates))
+        if wall_count + trap_count > candidates:
+            raise ValueError(f"{wall_count} walls and {trap_count} traps do not fit in a {height}x{width} map")
+        grid = np.zeros(cells, dtype=np.int8)
+        grid[-1] = 2
+        chosen = np.random.choice(candidates, wall_count + trap_count, replace=False) + 1
+        grid[chosen[:wall_count]] = 1
+        grid[chosen[wall_count:]] = -1
+        return grid.reshape(size)
 
+    @staticmethod
+    def gen_randmap(size, wall_density=None, trap_density=None):
+        """ Random map and its cells, see `gen_grid` """
+        grid = TreasureHunt2D.gen_grid(size, wall_density=wall_density, trap_density=trap_density)
+        size, all_coordinates, trap, path, wall, treasure, _ = TreasureHunt2D.rec_randmap(grid)
         return (
-            cp_allcs,
-            randmap,
-            trap_points,
-            wall_points,
-            treasure_point,
             all_coordinates,
+            df(grid),
+            trap,
+            wall,
+            treasure[0],
+            path,
         )
 
     @staticmethod
     def rec_randmap(maps):
-        coors, trap, wall, treasure, path, warrior = [[] for _ in range(6)]
-        c_dic = OrderedDict({
-            -1: trap,
-            0: path,
-            1: wall,
-            2: treasure,
-            3: warrior,
-        })
-        for r_ind, r_val in maps.iterrows():
-            for c_ind, c_val in r_val.iteritems():
-                pos = (r_ind, c_ind)
-                coors.append(pos)
-                c_dic.get(c_val).append(pos)
-        return [maps.shape[0], coors, *c_dic.values()]
+        """ Shape, coordinates and the cells of every map code (trap, path, wall, treasure, warrior) """
+        grid = np.asarray(maps)
+        height, width = grid.shape
+        coors = list(product(range(height), range(width)))
+        cells = [
+            list(zip(*(ind.tolist() for ind in np.nonzero(grid == code))))
+            for code in (-1, 0, 1, 2, 3)
+        ]
+        return [grid.shape, coors, *cells]
 
     def check_pos(func):
         def wrapper(self, pos=None, *args, **kwargs):
             if not pos:
-                pos = self.observation
+                pos = self.position
             return func(self, pos=pos, *args, **kwargs)
         return wrapper
        
-    def __init__(self, mapfile=None, size=(5, 5), warrior_ch='@', dest_ch='#', trap_ch='X', wall_ch='-', blank_ch=' '):
+    # Arrays of the static map, never written after construction. Envs may share
+    # them, see `clone` for envs of one process and `share` / `attach` across processes
+    static_arrays = ("grid", "next_state", "reward", "terminal", "valid_action_mask")
+
+    def __init__(self, mapfile=None, size=(5, 5), warrior_ch='@', dest_ch='#', trap_ch='X', wall_ch='-', blank_ch=' ', encoded=False, save=True, wall_density=None, trap_density=None):
+        # The int8 grid of map codes is the source of truth of the map, the cell
+        # sets are views over it with O(1) membership
         if (mapfile is None) or (not pathlib.Path(mapfile).exists()):
-            self.size = size
-            self.all_coordinates, self.maps, self.trap, self.wall, self.treasure, self.path = self.gen_randmap(self.size)
-            self.observation = (0, 0) #random.choice(self._path)
-            self.save_map()
+            size = (size, size) if isinstance(size, int) else size
+            self.grid = self.gen_grid(size, wall_density=wall_density, trap_density=trap_density)
+            if save:
+                self.save_map()
         else:
-            self.maps = self.load_map(mapfile)
-            self.size, self.all_coordinates, self.trap, self.path, self.wall, self.treasure, self.observation = self.rec_randmap(self.maps)
-            self.treasure = self.treasure[0]
-            self.observation = (0, 0)
+            self.grid = np.array(self.load_map(mapfile), dtype=np.int8)
+        self.setup(encoded, warrior_ch, dest_ch, trap_ch, wall_ch, blank_ch)
+
+    def setup(self, encoded=False, warrior_ch='@', dest_ch='#', trap_ch='X', wall_ch='-', blank_ch=' ', tables=None):
+        """ Everything but the grid, from precompiled `tables` (keyed by name) if given """
+        # In encoded mode states and actions are integer ids, see `encode_state` and `encode_action`
+        self.encoded = encoded
+        self.size = self.grid.shape
+        self.all_coordinates = list(product(range(self.size[0]), range(self.size[1])))
+        self.trap = CellSet(self.grid, (-1,))
+        self.path = CellSet(self.grid, (0,))
+        self.wall = CellSet(self.grid, (1,))
+        self.terminal_points = CellSet(self.grid, (-1, 2))
+        self.treasure = next(iter(CellSet(self.grid, (2,))))
         self.name = "TreasureHunt2D"
-        self.terminal_points = self.trap + [self.treasure]
         self.run_sleep = 0.1
         self.warrior_ch = warrior_ch
         self.dest_ch = dest_ch
@@ -117,22 +139,147 @@ class TreasureHunt2D:
         self.printfunc = [trapprint, bprint, wprint, tprint, eprint]
         self.char_map = dict(zip(self.points, self.char))
         self.print_map = dict(zip(self.points, self.printfunc))
-        self.observation_space = self.all_coordinates
-        self.action_space = [(0, 1), (1, 0), (0, -1), (-1, 0)]
+        self.moves = [(0, 1), (1, 0), (0, -1), (-1, 0)]
+        self.move_index = {move: ind for ind, move in enumerate(self.moves)}
+        if self.encoded:
+            self.observation_space = range(len(self.all_coordinates))
+            self.action_space = range(len(self.moves))
+        else:
+            self.observation_space = self.all_coordinates
+            self.action_space = self.moves
         self.directions_str = ['↓', '→', '↑', '←']
-        self.direction = dict(zip(self.action_space, self.directions_str))
+        self.direction = dict(zip(self.moves, self.directions_str))
         #TODO
         self.defaultrewards = [-10, -0.01, None, 10, None]
         self.reward_dic = dict(zip(self.points, self.defaultrewards))
+        if tables is None:
+            self.compile()
+        else:
+            for name, table in tables.items():
+                setattr(self, name, table)
+        self.index_actions()
+        for name in self.static_arrays:
+            getattr(self, name).flags.writeable = False
+        self.reset()
+
+    def clone(self):
+        """ Another env over the same static map and tables, with its own episode state """
+        env = object.__new__(type(self))
+        env.__dict__.update(self.__dict__)
+        env.reset()
+        return env
+
+    def share(self, directory):
+        """ Save the static arrays to `directory` and memory-map them read-only
+            Envs attached to `directory` in other processes then use the same
+            physical pages, see `attach`. Returns the directory.
+        """
+        directory = pathlib.Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in self.static_arrays:
+            np.save(directory / f"{name}.npy", getattr(self, name))
+        tables = self._load_static(directory)
+        self.grid = tables.pop("grid")
+        self.setup(self.encoded, self.warrior_ch, self.dest_ch, self.trap_ch, self.wall_ch, self.blank_ch, tables=tables)
+        return directory
+
+    @staticmethod
+    def _load_static(directory):
+        return {
+            name: np.load(pathlib.Path(directory) / f"{name}.npy", mmap_mode='r')
+            for name in TreasureHunt2D.static_arrays
+        }
+
+    @classmethod
+    def attach(cls, directory, encoded=False):
+        """ Env over the static arrays saved by `share`, without copying them """
+        env = object.__new__(cls)
+        tables = cls._load_static(directory)
+        env.grid = tables.pop("grid")
+        env.setup(encoded, tables=tables)
+        return env
+
+    def compile(self):
+        """ Precompute integer indexed tables of the static map
+            State `s` is the index of `(x, y)` in the observation space, i.e. `x * width + y`,
+            and action `a` the index in the action space.
+                next_state[s, a]: State after taking `a` in `s`, -1 if the move is not allowed
+                reward[s, a]: Reward of taking `a` in `s`
+                terminal[s]: Whether `s` is a trap or the treasure
+                valid_action_mask[s, a]: Whether `a` is allowed in `s`
+        """
+        height, width = self.size
+        grid = self.grid
+        moves = np.array(self.moves)
+        x, y = np.divmod(np.arange(height * width), width)
+        nx = x[:, np.newaxis] + moves[:, 0]
+        ny = y[:, np.newaxis] + moves[:, 1]
+        inside = (nx >= 0) & (nx < height) & (ny >= 0) & (ny < width)
+        cells = grid[np.clip(nx, 0, height - 1), np.clip(ny, 0, width - 1)]
+        self.valid_action_mask = inside & (cells != 1)
+        self.next_state = np.where(self.valid_action_mask, nx * width + ny, -1)
+        # Entering a cell without a reward of its own (the warrior) costs like a path
+        codes = min(self.reward_dic)
+        code_reward = np.zeros(max(self.reward_dic) - codes + 1)
+        for code, reward in self.reward_dic.items():
+            code_reward[code - codes] = self.reward_dic[0] if reward is None else reward
+        self.reward = code_reward[cells - codes]
+        self.reward[~self.valid_action_mask] = 0
+        self.terminal = np.isin(grid.reshape(-1), [-1, 2])
+
+    def index_actions(self):
+        # Moves available in a state only depend on which actions are valid, share
+        # one list per combination instead of building a list per call
+        bits = self.valid_action_mask @ (1 << np.arange(len(self.action_space)))
+        self._action_sets = [
+            [action for ind, action in enumerate(self.action_space) if combination >> ind & 1]
+            for combination in range(1 << len(self.action_space))
+        ]
+        self._valid_action_bits = bits.tolist()
+
+    def encode_state(self, pos):
+        return pos[0] * self.size[1] + pos[1]
+
+    def decode_state(self, state):
+        return self.all_coordinates[state]
+
+    def encode_action(self, move):
+        return self.move_index[move]
+
+    def decode_action(self, action):
+        return self.moves[action]
+
+    @property
+    def observation(self):
+        return self.state if self.encoded else self.position
+
+    @observation.setter
+    def observation(self, observation):
+        if self.encoded:
+            self.state, self.position = observation, self.decode_state(observation)
+        else:
+            self.state, self.position = self.encode_state(observation), observation
+
+    @property
+    def maps(self):
+        """ DataFrame view of the grid """
+        return df(self.grid, copy=False)
 
     @staticmethod
     def load_map(mapfile=mapfile):
-        maps = pd.read_csv(mapfile, index_col=0)
+        """ Read a map saved as CSV, or as an int8 array for a .npy file """
+        if pathlib.Path(mapfile).suffix == '.npy':
+            return df(np.load(mapfile))
+        maps = pd.read_csv(mapfile, index_col=0, dtype=np.int8)
+        maps.index = maps.index.astype(int)
         maps.columns = maps.columns.astype(int)
         return maps
 
     def save_map(self, mapfile=mapfile):
-        self.maps.to_csv(mapfile)
+        if pathlib.Path(mapfile).suffix == '.npy':
+            np.save(mapfile, self.grid)
+        else:
+            self.maps.to_csv(mapfile)
 
     def test(self):
         #pdb.set_trace()
@@ -147,7 +294,7 @@ class TreasureHunt2D:
 
     @check_pos
     def __getitem__(self, pos):
-        return self.maps.iat[pos]
+        return self.grid[pos]
 
     @check_pos
     def check_win(self, pos):
@@ -163,43 +310,40 @@ class TreasureHunt2D:
         return self.check_win(pos=npos)
  
     def action_filter(self, state):
-        all_moves = self.action_space
-        amoves = []
-        for move in all_moves:
-            npos = add_tuple(state, move)
-            if not (npos in self.wall or self.check_boundary(npos)):
-                amoves.append(move)
-        return amoves
+        if not self.encoded:
+            state = self.encode_state(state)
+        return self._action_sets[self._valid_action_bits[state]]
 
     def move(self, direction):
-        pos = add_tuple(self.observation, direction)
+        pos = add_tuple(self.position, direction)
         return pos
 
     def step(self, action):
-        self.history_path.append(self.observation)
-        self.maps.at[self.observation] = 0
-        self.observation = self.move(direction=action)
-        #self.maps.at[self.observation] = 1
-        #print(self.observation)
-        reward = self.reward_dic[self.maps.at[self.observation]]
-        done = False
-        if self.observation in self.terminal_points:
-            done = True
+        action_ind = action if self.encoded else self.move_index[action]
+        next_state = int(self.next_state[self.state, action_ind])
+        if next_state < 0:
+            raise ValueError(f"Action {action} is not available at {self.position}")
+        self.history_path.append(self.position)
+        reward = self.reward[self.state, action_ind]
+        self.state, self.position = next_state, self.all_coordinates[next_state]
+        done = bool(self.terminal[next_state])
         return self.observation, reward, done, {}
 
     def reset(self):
-        self.observation = (0, 0)
-        self.history_path.clear()
+        # The episode state is the position and the path, the map never changes
+        self.state, self.position = 0, (0, 0)
+        self.history_path = []
         return self.observation
 
     def render(self):
-        pos = self.observation
+        pos = self.position
+        visited = set(self.history_path)
         for x, row in self.maps.iterrows():
             print('|', end='')
             for y, col in row.iteritems():
                 if (x, y) == pos:
                     eprint(self.warrior_ch)
-                elif (x, y) in self.history_path:
+                elif (x, y) in visited:
                     hprint(self.warrior_ch)
                 else:
                     self.print_map.get(col)(self.char_map.get(col))
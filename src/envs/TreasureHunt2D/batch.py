@@ -0,0 +1,82 @@
+import numpy as np
+
+
+class BatchTreasureHunt2D:
+    def __init__(self, maps, action_space, reward_dic, start=(0, 0)):
+        """ N TreasureHunt2D maps stepped in lockstep
+            States are integer ids `x * width + y`, i.e. the row of `(x, y)` in
+            the observation space of a single TreasureHunt2D of the same size.
+
+            Parameters:
+                @maps: Integer map codes with shape (N, height, width) or (height, width)
+                @action_space: Moves as (dx, dy) tuples
+                @reward_dic: Reward of entering a cell, keyed by map code
+                @start: Start position of every agent
+        """
+        maps = np.asarray(maps, dtype=np.int8)
+        if maps.ndim == 2:
+            maps = maps[np.newaxis]
+        self.maps = maps
+        self.batch_size, self.height, self.width = maps.shape
+        self.size = (self.height, self.width)
+        self.name = "TreasureHunt2D"
+        self.start = start
+        self.observation_space = [(x, y) for x in range(self.height) for y in range(self.width)]
+        self.action_space = action_space
+        self.moves = np.array(action_space, dtype=np.intp)
+        # Map codes range from -1 (trap) to 3 (warrior), shift by one to index
+        codes = sorted(reward_dic)
+        self._code_offset = -codes[0]
+        self._reward = np.zeros(codes[-1] - codes[0] + 1)
+        for code, reward in reward_dic.items():
+            self._reward[code + self._code_offset] = reward or 0
+        self._terminal = np.zeros(self._reward.shape, dtype=bool)
+        self._terminal[[-1 + self._code_offset, 2 + self._code_offset]] = True
+        self._batch = np.arange(self.batch_size)
+        self.positions = np.empty((self.batch_size, 2), dtype=np.intp)
+        self.reset()
+
+    @classmethod
+    def from_envs(cls, envs):
+        env = envs[0]
+        maps = np.stack([e.maps.to_numpy() for e in envs])
+        return cls(maps, env.moves, env.reward_dic)
+
+    @classmethod
+    def copies(cls, env, n):
+        maps = np.broadcast_to(env.maps.to_numpy(), (n, *env.maps.shape))
+        return cls(maps, env.moves, env.reward_dic)
+
+    @property
+    def observation(self):
+        return self.positions[:, 0] * self.width + self.positions[:, 1]
+
+    def reset(self, where=None):
+        """ Move agents back to the start, all of them or those selected by the boolean mask `where` """
+        if where is None:
+            self.positions[:] = self.start
+        else:
+            self.positions[where] = self.start
+        return self.observation
+
+    def action_filter(self, states=None):
+        """ Boolean mask (N, number of actions) of moves that stay on the map and off the walls """
+        if states is None:
+            positions = self.positions
+        else:
+            positions = np.stack(np.divmod(states, self.width), axis=-1)
+        npos = positions[:, np.newaxis, :] + self.moves[np.newaxis]
+        inside = (
+            (npos[..., 0] >= 0) & (npos[..., 0] < self.height)
+            & (npos[..., 1] >= 0) & (npos[..., 1] < self.width)
+        )
+        x = np.clip(npos[..., 0], 0, self.height - 1)
+        y = np.clip(npos[..., 1], 0, self.width - 1)
+        cells = self.maps[self._batch[:, np.newaxis], x, y]
+        return inside & (cells != 1)
+
+    def step(self, actions):
+        """ Apply one action index per agent, return (states, rewards, dones, info) arrays """
+        self.positions += self.moves[actions]
+        cells = self.maps[self._batch, self.positions[:, 0], self.positions[:, 1]] + self._code_offset
+        return self.observation, self._reward[cells], self._terminal[cells], {}
@@ -0,0 +1,40 @@
+from collections.abc import Set
+
+import numpy as np
+
+
+class CellSet(Set):
+    def __init__(self, grid, codes):
+        """ Read-only set of the (x, y) cells of a map grid holding one of `codes`
+            The grid is the source of truth, so membership is one lookup and the
+            set follows later changes of the grid.
+
+            Parameters:
+                @grid: Integer map codes with shape (height, width)
+                @codes: Map codes of the cells in the set
+        """
+        self.grid = grid
+        self.codes = tuple(codes)
+
+    def __contains__(self, pos):
+        try:
+            x, y = pos
+        except (TypeError, ValueError):
+            return False
+        # Negative indices would wrap around
+        if not (0 <= x < self.grid.shape[0] and 0 <= y < self.grid.shape[1]):
+            return False
+        return int(self.grid[x, y]) in self.codes
+
+    def mask(self):
+        return np.isin(self.grid, self.codes)
+
+    def __iter__(self):
+        xs, ys = np.nonzero(self.mask())
+        return zip(xs.tolist(), ys.tolist())
+
+    def __len__(self):
+        return int(self.mask().sum())
+
+    def __repr__(self):
+        return f"CellSet(codes={self.codes}, cells={len(self)})"
@@ -1,4 +1,11 @@
+import io
+import json
+import random
+import pathlib
+import tempfile
 import unittest
+import contextlib
+import numpy as np
 import src.AI.agent as agent
 import src.envs.TreasureHunt as th
 
@@ -19,3 +26,38 @@ class TestAgent(unittest.TestCase):
         m_action = ag.argmax(ag.q_table, state, actions)
         self.assertEqual(action, m_action)
         
+
+    def test_encoded_env_learns_same_table(self):
+        tables = []
+        for encoded in (False, True):
+            random.seed(0)
+            np.random.seed(0)
+            with tempfile.TemporaryDirectory() as tmp:
+                ag = agent.Agent(
+                    env=th.TreasureHunt(size=7, encoded=encoded),
+                    q_file=pathlib.Path(tmp) / 'Q.csv',
+                    max_train_episodes=20,
+                )
+                ag.result_path = pathlib.Path(tmp)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    ag.train("SARSA_lambda")
+            tables.append(ag.q_table.values)
+        np.testing.assert_array_equal(*tables)
+
+    def test_profile(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            ag = agent.Agent(
+                env=th.TreasureHunt(size=5),
+                q_file=pathlib.Path(tmp) / 'Q.csv',
+                max_train_episodes=3,
+                profile_file=pathlib.Path(tmp) / 'trace.json',
+            )
+            ag.result_path = pathlib.Path(tmp)
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = ag.train("SARSA_lambda")
+            self.assertEqual(len(result["profile"]), 3)
+            for record, steps in zip(result["profile"], result["episode_steps"]):
+                self.assertEqual(record["phases"]["env.step"]["count"], steps + 1)
+                self.assertEqual(record["phases"]["io"]["count"], 1)
+            trace = json.loads((pathlib.Path(tmp) / 'trace.json').read_text())
+            self.assertEqual(sum(e["name"] == "episode" for e in trace["traceEvents"]), 3)
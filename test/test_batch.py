@@ -0,0 +1,41 @@
+import io
+import unittest
+import contextlib
+import numpy as np
+import src.envs.TreasureHunt2D as th2d
+import src.AI.agent as agent
+from src.envs.TreasureHunt2D.batch import BatchTreasureHunt2D
+
+
+class TestBatchTH2D(unittest.TestCase):
+    def setUp(self):
+        self.env = th2d.TreasureHunt2D(mapfile=th2d.mapfile)
+        self.batch = BatchTreasureHunt2D.copies(self.env, 3)
+
+    def test_step_matches_env(self):
+        state = self.env.reset()
+        states = self.batch.reset()
+        for _ in range(20):
+            mask = self.batch.action_filter(states)
+            actions = self.env.action_filter(state)
+            self.assertEqual([self.env.action_space[i] for i in np.flatnonzero(mask[0])], actions)
+            action = actions[np.random.randint(len(actions))]
+            a_ind = self.env.action_space.index(action)
+            state, reward, done, info = self.env.step(action)
+            states, rewards, dones, info = self.batch.step(np.full(3, a_ind))
+            self.assertEqual(self.env.observation_space[states[1]], state)
+            self.assertEqual(rewards[2], reward)
+            self.assertEqual(dones[0], done)
+            if done:
+                state = self.env.reset()
+                states = self.batch.reset(dones)
+
+    def test_train_batch(self):
+        ag = agent.Agent(env=self.env, max_train_episodes=30)
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = ag.train_batch(self.batch, "Q_learning")
+        self.assertGreaterEqual(result["episode_number"], 30)
+        self.assertEqual(len(result["q_sum"]), result["episode_number"])
+        self.assertTrue(np.isfinite(ag.q_table.values).all())
+        with self.assertRaises(ValueError):
+            ag.train_batch(self.batch, "SARSA_lambda")
@@ -0,0 +1,42 @@
+import io
+import pathlib
+import tempfile
+import unittest
+import contextlib
+import numpy as np
+import src.AI.agent as agent
+import src.envs.TreasureHunt as th
+from src.AI.checkpoint import Checkpoint, atomic_write
+
+
+class TestCheckpoint(unittest.TestCase):
+    def test_atomic_write_keeps_old_file_on_error(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            file_name = pathlib.Path(tmp) / 'Q.csv'
+            file_name.write_text('old')
+
+            def fail(name):
+                pathlib.Path(name).write_text('partial')
+                raise RuntimeError
+
+            with self.assertRaises(RuntimeError):
+                atomic_write(file_name, fail)
+            self.assertEqual(file_name.read_text(), 'old')
+            self.assertEqual(list(pathlib.Path(tmp).iterdir()), [file_name])
+
+    def test_due(self):
+        checkpoint = Checkpoint(episodes=5)
+        self.assertEqual([e for e in range(1, 12) if checkpoint.due(e)], [5, 10])
+        self.assertTrue(Checkpoint(seconds=0).due(1))
+        self.assertFalse(Checkpoint().due(1))
+
+    def test_train_streams_metrics(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = pathlib.Path(tmp)
+            ag = agent.Agent(env=th.TreasureHunt(size=5), q_file=tmp / 'Q.csv', max_train_episodes=15)
+            ag.result_path = tmp / 'results'
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = ag.train("Q_learning")
+            log = np.loadtxt(ag.result_path / 'TreasureHunt1D-Q_learning-train-Q_sum.txt')
+            np.testing.assert_array_equal(log[:, 1], result["q_sum"])
+            np.testing.assert_array_equal(np.loadtxt(tmp / 'Q.csv', delimiter=','), ag.q_table.values)
@@ -0,0 +1,65 @@
+import io
+import random
+import pathlib
+import tempfile
+import unittest
+import contextlib
+import numpy as np
+import src.envs.TreasureHunt as th
+import src.envs.TreasureHunt2D as th2d
+from src.AI.agent import Agent
+from src.AI.convergence import ConvergenceTracker
+
+
+class TestConvergenceTracker(unittest.TestCase):
+    def test_window(self):
+        tracker = ConvergenceTracker(q_sum=1.0, window=2)
+        tracker.update(td_error=2.0, delta=0.2)
+        tracker.update_many(td_error=-1.0, deltas=np.array([-0.1, -0.05]))
+        self.assertEqual(tracker.end_episode(), (0.2, np.sqrt(2.5)))
+        self.assertAlmostEqual(tracker.q_sum, 1.05)
+        # Undefined until the window is full, or the previous sum known
+        self.assertFalse(tracker.converged("max_delta", 1))
+        self.assertFalse(tracker.converged("loss", 1))
+        tracker.next_episode()
+        tracker.update(td_error=0.1, delta=0.01)
+        tracker.end_episode()
+        self.assertTrue(tracker.converged("loss", 0.02))
+        self.assertEqual(tracker.value("max_delta"), 0.2)
+        self.assertAlmostEqual(tracker.value("td_error"), np.sqrt(5.01 / 3))
+        tracker.next_episode()
+        tracker.update(td_error=0.1, delta=0.01)
+        tracker.end_episode()
+        self.assertEqual(tracker.value("max_delta"), 0.01)
+
+
+class TestAgentConvergence(unittest.TestCase):
+    def train(self, env, algorithm, **kwargs):
+        random.seed(0)
+        np.random.seed(0)
+        with tempfile.TemporaryDirectory() as tmp:
+            agent = Agent(env=env, q_file=pathlib.Path(tmp) / 'Q.bin', initial_q_mode="random", **kwargs)
+            agent.result_path = pathlib.Path(tmp)
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = agent.train(algorithm)
+        return agent, result
+
+    def test_running_sum(self):
+        for env in (th.TreasureHunt(size=7), th2d.TreasureHunt2D(size=(6, 6), save=False)):
+            for algorithm in ("Q_learning", "SARSA_lambda"):
+                agent, result = self.train(env, algorithm, max_train_episodes=30)
+                n = result["episode_number"]
+                self.assertAlmostEqual(result["q_sum"][n - 1], agent.q_table.sum())
+                self.assertTrue((result["max_delta"][:n] > 0).all())
+
+    def test_max_delta_termination(self):
+        for compiled in (False, True):
+            agent, result = self.train(
+                th2d.TreasureHunt2D(size=(6, 6), save=False), "Q_learning", max_train_episodes=5000,
+                termination_type="max_delta", termination_precision=1e-3, termination_window=5,
+                compiled=compiled,
+            )
+            n = result["episode_number"]
+            self.assertLess(n, 5000)
+            self.assertLess(result["max_delta"][n - 5:n].max(), 1e-3)
+            self.assertGreaterEqual(result["max_delta"][:n - 5].max(), 1e-3)
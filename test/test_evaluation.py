@@ -0,0 +1,36 @@
+import unittest
+import numpy as np
+import src.envs.TreasureHunt as th
+import src.envs.TreasureHunt2D as th2d
+from src.AI import evaluation, planning
+from src.AI.agent import Agent
+
+
+class TestEvaluation(unittest.TestCase):
+    def test_optimal_policy_succeeds(self):
+        env = th.TreasureHunt(size=7)
+        result = evaluation.evaluate(env, planning.solve(env))
+        np.testing.assert_array_equal(result.starts, np.arange(1, 6))
+        self.assertEqual(result.success_rate, 1)
+        np.testing.assert_array_equal(result.steps, [5, 4, 3, 2, 1])
+        np.testing.assert_allclose(result.returns, 10 - 0.05 * (result.steps - 1))
+
+    def test_loops_and_traps(self):
+        env = th.TreasureHunt(size=7)
+        q_values = np.zeros((7, 2))
+        # Move left from states 1 and 2 (into the trap), bounce between 3 and 4
+        q_values[[1, 2, 4], 0] = 1
+        q_values[[3, 5], 1] = 1
+        result = evaluation.evaluate(env, q_values, max_steps=20)
+        np.testing.assert_array_equal(result.terminated, [True, True, False, False, True])
+        np.testing.assert_array_equal(result.success, [False, False, False, False, True])
+        np.testing.assert_array_equal(result.steps, [1, 2, 20, 20, 1])
+        self.assertAlmostEqual(result.success_rate, 0.2)
+
+    def test_agent_evaluate(self):
+        env = th2d.TreasureHunt2D(mapfile=th2d.mapfile)
+        agent = Agent(env=env, initial_q_mode="zero")
+        agent.q_table = planning.solve(env)
+        result = agent.evaluate()
+        self.assertTrue(result.success[list(result.starts).index(0)])
+        self.assertFalse((result.terminated & ~result.success).any())
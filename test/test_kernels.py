@@ -0,0 +1,51 @@
+import io
+import random
+import pathlib
+import tempfile
+import unittest
+import contextlib
+from unittest import mock
+import numpy as np
+import src.envs.TreasureHunt2D as th2d
+from src.AI import kernels
+from src.AI.agent import Agent
+
+
+def train(compiled, algorithm, seed, max_train_episodes=1):
+    random.seed(seed)
+    np.random.seed(seed)
+    env = th2d.TreasureHunt2D(size=(8, 8), save=False)
+    with tempfile.TemporaryDirectory() as tmp:
+        agent = Agent(
+            env=env,
+            q_file=pathlib.Path(tmp) / 'Q.bin',
+            max_train_episodes=max_train_episodes,
+            epsilon_base=0.3,
+            initial_q_mode="random",
+            compiled=compiled,
+        )
+        agent.result_path = pathlib.Path(tmp)
+        kernels.seed(seed)
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = agent.train(algorithm)
+    return agent.q_table.values, result
+
+
+class TestKernels(unittest.TestCase):
+    @unittest.skipIf(kernels.compiled, "numba draws from its own random generator")
+    def test_matches_interpreted_episode(self):
+        # Draw the interpreted policy from the same stream as the kernel
+        with mock.patch("numpy.random.uniform", random.random), \
+                mock.patch("random.choice", lambda seq: seq[random.randrange(len(seq))]):
+            for algorithm in kernels.algorithm_codes:
+                for seed in range(3):
+                    q_values, result = train(False, algorithm, seed)
+                    k_values, k_result = train(True, algorithm, seed)
+                    np.testing.assert_array_equal(q_values, k_values)
+                    self.assertEqual(result["episode_steps"][0], k_result["episode_steps"][0])
+
+    def test_agent_trains_in_kernel(self):
+        q_values, result = train(True, "SARSA_lambda", 0, max_train_episodes=50)
+        self.assertEqual(result["episode_number"], 50)
+        self.assertTrue((result["episode_steps"] > 0).all())
+        np.testing.assert_allclose(result["q_sum"][-1], q_values.sum())
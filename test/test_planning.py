@@ -0,0 +1,34 @@
+import tempfile
+import pathlib
+import unittest
+import numpy as np
+import src.envs.TreasureHunt as th
+import src.envs.TreasureHunt2D as th2d
+from src.AI import planning
+from src.AI.qtable import QTable
+
+
+class TestPlanning(unittest.TestCase):
+    def test_treasure_hunt(self):
+        env = th.TreasureHunt(size=7)
+        q_table = planning.solve(env)
+        self.assertAlmostEqual(q_table[(5,), 1], 10)
+        self.assertAlmostEqual(q_table[(1,), -1], -10)
+        self.assertAlmostEqual(q_table[(3,), 1], 10 - 2 * 0.05)
+        self.assertEqual(env.observation, (3,))
+
+    def test_methods_agree_and_reach_treasure(self):
+        env = th2d.TreasureHunt2D(mapfile=th2d.mapfile)
+        q_table = planning.solve(env, method="value_iteration")
+        np.testing.assert_allclose(planning.solve(env, method="policy_iteration").values, q_table.values)
+        model = planning.build_model(env)
+        self.assertEqual(planning.q_error(q_table.values, q_table.values, model), 0)
+        state, done = env.reset(), False
+        while not done:
+            state, reward, done, info = env.step(q_table.argmax(state, env.action_filter(state)))
+        self.assertEqual(state, env.treasure)
+        with tempfile.TemporaryDirectory() as tmp:
+            q_file = pathlib.Path(tmp) / 'Q.bin'
+            q_table.dump(q_file, env_name=env.name)
+            np.testing.assert_array_equal(
+                QTable.read(q_file, env.observation_space, env.action_space).values, q_table.values)
@@ -0,0 +1,50 @@
+import unittest
+import tempfile
+import pathlib
+import numpy as np
+from src.AI.qtable import QTable
+
+
+class TestQTable(unittest.TestCase):
+    def setUp(self):
+        self.states = [(x, y) for x in range(2) for y in range(3)]
+        self.actions = [(0, 1), (1, 0), (0, -1), (-1, 0)]
+        self.q_table = QTable(self.states, self.actions)
+
+    def test_label_access(self):
+        self.q_table.at[(1, 2), (1, 0)] = 5
+        self.assertEqual(self.q_table[(1, 2), (1, 0)], 5)
+        self.assertEqual(self.q_table.values[5, 1], 5)
+        self.assertEqual(self.q_table.argmax((1, 2)), (1, 0))
+        self.assertEqual(self.q_table.argmax((1, 2), [(0, 1), (0, -1)]), (0, 1))
+
+    def test_csv_round_trip(self):
+        self.q_table.values[:] = np.random.random(self.q_table.shape)
+        with tempfile.TemporaryDirectory() as tmp:
+            q_file = pathlib.Path(tmp) / 'Q.csv'
+            self.q_table.to_csv(q_file)
+            loaded = QTable.from_csv(q_file, self.states, self.actions)
+        np.testing.assert_array_equal(loaded.values, self.q_table.values)
+        df = loaded.to_dataframe()
+        self.assertEqual(list(df.index), self.states)
+        np.testing.assert_array_equal(df.values, self.q_table.values)
+
+    def test_binary_round_trip(self):
+        self.q_table.values[:] = np.random.random(self.q_table.shape)
+        with tempfile.TemporaryDirectory() as tmp:
+            q_file = pathlib.Path(tmp) / 'Q.bin'
+            self.q_table.save(q_file, env_name="TreasureHunt2D")
+            header, offset = QTable.read_header(q_file)
+            self.assertEqual(header["env"], "TreasureHunt2D")
+            self.assertEqual(header["states"], {"grid": [2, 3]})
+            self.assertEqual(offset % 64, 0)
+            loaded = QTable.load(q_file)
+            self.assertIsInstance(loaded.values.base, np.memmap)
+            self.assertEqual(loaded.states, self.states)
+            self.assertEqual(loaded.actions, self.actions)
+            np.testing.assert_array_equal(loaded.values, self.q_table.values)
+            loaded.values[0, 0] = -1
+            np.testing.assert_array_equal(QTable.load(q_file, mmap_mode=None).values, self.q_table.values)
+            with self.assertRaises(ValueError):
+                QTable.load(q_file, states=self.states[:-1], actions=self.actions)
+            del loaded
@@ -0,0 +1,37 @@
+import unittest
+import numpy as np
+from src.AI.selection import ActionSelector
+
+
+class TestActionSelector(unittest.TestCase):
+    def assert_cache(self, selector, q_values, mask):
+        masked = np.where(mask, q_values, -np.inf)
+        self.assertEqual(selector.best, masked.argmax(axis=1).tolist())
+        self.assertEqual(selector.max_action, q_values.argmax(axis=1).tolist())
+        self.assertEqual(selector.max_value, q_values.max(axis=1).tolist())
+
+    def test_incremental_updates(self):
+        rng = np.random.RandomState(0)
+        # Few distinct values so that ties happen
+        q_values = rng.randint(0, 3, size=(6, 4)).astype(float)
+        mask = rng.random_sample((6, 4)) < 0.7
+        mask[:, 0] = True
+        selector = ActionSelector(q_values, mask)
+        self.assert_cache(selector, q_values, mask)
+        for _ in range(500):
+            row, col = rng.randint(6), rng.randint(4)
+            q_values[row, col] = rng.randint(0, 3)
+            selector.update(row, col)
+            self.assert_cache(selector, q_values, mask)
+        q_values.flat[[1, 5, 17]] += 10
+        selector.refresh_entries([1, 5, 17])
+        self.assert_cache(selector, q_values, mask)
+
+    def test_epsilon_greedy(self):
+        q_values = np.array([[0., 5., 1.], [0., 0., 0.]])
+        mask = np.array([[True, False, True], [False, True, False]])
+        selector = ActionSelector(q_values, mask)
+        self.assertEqual(selector.greedy(0), 2)
+        self.assertEqual(selector.epsilon_greedy(0, 0), 2)
+        self.assertEqual(selector.epsilon_greedy(1, 1), 1)
+        self.assertTrue(all(selector.epsilon_greedy(0, 1) in (0, 2) for _ in range(50)))
@@ -0,0 +1,21 @@
+import io
+import types
+import tempfile
+import unittest
+import contextlib
+import config
+from src.analysis.sweep import sweep
+
+
+class TestSweep(unittest.TestCase):
+    def test_sweep_fills_result(self):
+        conf = types.SimpleNamespace(**{k: getattr(config, k) for k in dir(config) if not k.startswith('_')})
+        conf.env_name, conf.env_conf = "TreasureHunt", {"size": 5}
+        conf.algorithms = ["Q_learning", "SARSA"]
+        conf.objective_values = [0.1, 0.3]
+        conf.max_train_episodes = 20
+        conf.train_termination_config = {"termination_type": "episode", "termination_precision": None}
+        with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+            result = sweep(conf, max_workers=2, result_path=tmp)
+        self.assertEqual(result.metric_values.shape, (2, 2, len(conf.metrics), 20))
+        self.assertTrue(result[("SARSA", 0.3, "episode_total_reward")].all())
@@ -1,7 +1,16 @@
+import tempfile
+import pathlib
 import unittest
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import src.envs.TreasureHunt2D as th2d
 
 
+def walk_attached(directory, moves):
+    env = th2d.TreasureHunt2D.attach(directory)
+    return [env.step(move)[0] for move in moves]
+
+
 class TestTH2D(unittest.TestCase):
     def setUp(self):
         self.env = th2d.TreasureHunt2D()
@@ -32,3 +41,122 @@ class TestTH2D(unittest.TestCase):
         f_ass = [(1, 0), (0, -1)]
         self.assertCountEqual(f_actions, f_ass)
 
+
+
+class TestTH2DTables(unittest.TestCase):
+    def setUp(self):
+        self.env = th2d.TreasureHunt2D(mapfile=th2d.mapfile)
+
+    def test_tables_match_map(self):
+        env = self.env
+        for s, pos in enumerate(env.observation_space):
+            moves = [
+                move for move in env.action_space
+                if not (th2d.add_tuple(pos, move) in env.wall or env.check_boundary(th2d.add_tuple(pos, move)))
+            ]
+            self.assertEqual(env.action_filter(pos), moves)
+            self.assertEqual(env.terminal[s], pos in env.terminal_points)
+            if env.terminal[s]:
+                continue
+            for move in moves:
+                env.observation = pos
+                next_state, reward, done, info = env.step(move)
+                self.assertEqual(next_state, th2d.add_tuple(pos, move))
+                self.assertEqual(reward, env.reward_dic[env.maps.at[next_state]])
+                self.assertEqual(done, next_state in env.terminal_points)
+
+    def test_encoded_mode(self):
+        env = th2d.TreasureHunt2D(mapfile=th2d.mapfile, encoded=True)
+        self.assertEqual(env.observation_space, range(25))
+        self.assertEqual(env.action_space, range(4))
+        state = env.reset()
+        pos = self.env.reset()
+        for _ in range(10):
+            actions = env.action_filter(state)
+            self.assertEqual([env.decode_action(a) for a in actions], self.env.action_filter(pos))
+            action = actions[-1]
+            state, reward, done, info = env.step(action)
+            pos, t_reward, t_done, info = self.env.step(env.decode_action(action))
+            self.assertEqual(env.decode_state(state), pos)
+            self.assertEqual(env.encode_state(pos), state)
+            self.assertEqual((reward, done), (t_reward, t_done))
+            if done:
+                break
+
+
+class TestTH2DMaps(unittest.TestCase):
+    def test_densities(self):
+        np.random.seed(0)
+        env = th2d.TreasureHunt2D(size=(40, 50), save=False, wall_density=0.2, trap_density=0.1)
+        grid = env.maps.to_numpy()
+        self.assertEqual(grid.shape, (40, 50))
+        self.assertEqual((grid == 1).sum(), round(0.2 * (40 * 50 - 2)))
+        self.assertEqual((grid == -1).sum(), round(0.1 * (40 * 50 - 2)))
+        self.assertEqual(grid[0, 0], 0)
+        self.assertEqual(env.treasure, (39, 49))
+        self.assertCountEqual(env.wall, [tuple(pos) for pos in np.argwhere(grid == 1).tolist()])
+        trap = tuple(np.argwhere(grid == -1)[0].tolist())
+        self.assertIn(trap, env.trap)
+        self.assertIn(trap, env.terminal_points)
+        self.assertIn(env.treasure, env.terminal_points)
+        self.assertNotIn(trap, env.wall)
+        self.assertNotIn((-1, 0), env.path)
+        with self.assertRaises(ValueError):
+            th2d.TreasureHunt2D(size=(4, 4), save=False, wall_density=0.6, trap_density=0.5)
+
+    def test_npy_round_trip(self):
+        env = th2d.TreasureHunt2D(mapfile=th2d.mapfile)
+        with tempfile.TemporaryDirectory() as tmp:
+            mapfile = pathlib.Path(tmp) / 'map.npy'
+            env.save_map(mapfile)
+            self.assertEqual(np.load(mapfile).dtype, np.int8)
+            loaded = th2d.TreasureHunt2D(mapfile=mapfile)
+        np.testing.assert_array_equal(loaded.maps.to_numpy(), env.maps.to_numpy())
+        self.assertEqual((loaded.size, loaded.trap, loaded.wall, loaded.treasure), (env.size, env.trap, env.wall, env.treasure))
+        np.testing.assert_array_equal(loaded.next_state, env.next_state)
+        np.testing.assert_array_equal(loaded.reward, env.reward)
+
+
+class TestTH2DStaticMap(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(1)
+        self.env = th2d.TreasureHunt2D(size=(6, 6), save=False)
+
+    def walk(self, env):
+        state, done, moves, states = env.reset(), False, [], []
+        for _ in range(10):
+            available = env.action_filter(state)
+            if done or not available:
+                break
+            state, reward, done, info = env.step(available[0])
+            moves.append(available[0])
+            states.append(state)
+        return moves, states
+
+    def test_step_keeps_map(self):
+        grid = self.env.grid.copy()
+        self.walk(self.env)
+        np.testing.assert_array_equal(self.env.grid, grid)
+        self.assertFalse(self.env.grid.flags.writeable)
+        self.env.reset()
+        self.assertEqual(self.env.history_path, [])
+
+    def test_clone_shares_map(self):
+        clone = self.env.clone()
+        self.assertIs(clone.grid, self.env.grid)
+        self.assertIs(clone.next_state, self.env.next_state)
+        clone.step(clone.action_filter(clone.observation)[0])
+        self.assertEqual(self.env.observation, (0, 0))
+        self.assertEqual(self.env.history_path, [])
+
+    def test_share_and_attach(self):
+        moves, states = self.walk(self.env)
+        with tempfile.TemporaryDirectory() as tmp:
+            self.env.share(tmp)
+            self.assertIsInstance(self.env.next_state, np.memmap)
+            self.assertEqual(self.walk(self.env), (moves, states))
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                self.assertEqual(pool.submit(walk_attached, tmp, moves).result(), states)
+            attached = th2d.TreasureHunt2D.attach(tmp, encoded=True)
+            np.testing.assert_array_equal(attached.reward, self.env.reward)
+            self.assertEqual(attached.treasure, self.env.treasure)
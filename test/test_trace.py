@@ -0,0 +1,34 @@
+import unittest
+import numpy as np
+from src.AI.trace import EligibilityTrace
+
+
+class TestEligibilityTrace(unittest.TestCase):
+    def test_matches_dense_update(self):
+        shape = (6, 4)
+        trace = EligibilityTrace(shape, cutoff=0)
+        dense = np.zeros(shape)
+        q_sparse, q_dense = np.zeros(shape), np.zeros(shape)
+        for row, col, step in [(0, 1, 0.5), (2, 3, -1.0), (0, 1, 0.25), (5, 0, 2.0)]:
+            trace.visit(row, col)
+            dense[row, col] += 1
+            trace.update(q_sparse, step)
+            q_dense += step * dense
+            trace.decay(0.81)
+            dense *= 0.81
+        np.testing.assert_allclose(q_sparse, q_dense)
+        np.testing.assert_allclose(trace.values, dense)
+        self.assertEqual(len(trace), 3)
+
+    def test_cutoff_drops_small_traces(self):
+        trace = EligibilityTrace((3, 2), cutoff=0.5)
+        trace.visit(1, 1)
+        trace.decay(0.6)
+        self.assertEqual(len(trace), 1)
+        trace.decay(0.6)
+        self.assertEqual(len(trace), 0)
+        self.assertFalse(trace.values.any())
+        trace.visit(2, 0)
+        trace.clear()
+        self.assertEqual(len(trace), 0)
+        self.assertFalse(trace.values.any())